@@ -6,14 +6,21 @@ Main module
 """
 
 import enum
+import itertools
 import json
+import threading
 import time
-from datetime import datetime
+from concurrent.futures import Future, TimeoutError
 from websockets.sync.client import connect
 from websockets.exceptions import WebSocketException
 
+from positions import PositionBook, Transaction
+from throttle import TokenBucket
+from trading_hours import TradingHours
+
 LOGIN_TIMEOUT = 120
-MAX_TIME_INTERVAL = 0.200
+REQUEST_TIMEOUT = 60
+QUOTE_TTL = 1.0
 
 
 class CommandFailed(Exception):
@@ -99,6 +106,20 @@ def _get_data(command, **parameters):
     return data
 
 
+def candle_columns(chart):
+    """decode the rateInfos of a chart response in one vectorized step,
+    return: dict of numpy arrays with the keys of get_lastn_candle_history"""
+    import numpy as np
+    keys = ('ctm', 'open', 'close', 'high', 'low', 'vol')
+    rate_infos = chart['rateInfos']
+    raw = np.fromiter((candle[k] for candle in rate_infos for k in keys),
+                      dtype=float, count=len(rate_infos) * len(keys))
+    ctm, op, cl, hg, lw, vol = raw.reshape(-1, len(keys)).T
+    scale = 10 ** chart['digits']
+    return {'timestamp': ctm / 1000, 'open': op / scale, 'close': (op + cl) / scale,
+            'high': (op + hg) / scale, 'low': (op + lw) / scale, 'volume': vol}
+
+
 def _check_mode(mode):
     """check if mode acceptable"""
     modes = [x.value for x in MODES]
@@ -126,10 +147,14 @@ def _check_volume(volume):
 class BaseClient(object):
     """main client class"""
 
-    def __init__(self):
+    def __init__(self, limiter=None):
         self.ws = None
         self._login_data = None
-        self._time_last_request = time.time() - MAX_TIME_INTERVAL
+        self.limiter = limiter
+        self.mode = None
+        self.stream_session_id = None
+        self._tags = itertools.count(1)
+        self._pending = {}
         self.status = STATUS.NOT_LOGGED
 
     def _login_decorator(self, func, *args, **kwargs):
@@ -138,30 +163,79 @@ class BaseClient(object):
         try:
             return func(*args, **kwargs)
         except SocketError as e:
-            self.login(self._login_data[0], self._login_data[1])
+            self.login(self._login_data[0], self._login_data[1], self.mode)
             print(self._login_data)
             return func(*args, **kwargs)
         except Exception as e:
-            self.login(self._login_data[0], self._login_data[1])
+            self.login(self._login_data[0], self._login_data[1], self.mode)
             return func(*args, **kwargs)
 
-    def _send_command(self, dict_data):
-        """send command to api"""
-        time_interval = time.time() - self._time_last_request
-        if time_interval < MAX_TIME_INTERVAL:
-            time.sleep(MAX_TIME_INTERVAL - time_interval)
+    def _connect(self, url):
+        """open the socket and start dispatching its responses by customTag"""
+        if self.ws is not None:
+            self.ws.close()
+        self.ws = connect(url)
+        self._pending = {}
+        threading.Thread(target=self._read_loop, args=(self.ws, self._pending),
+                         daemon=True).start()
+
+    @staticmethod
+    def _read_loop(ws, pending):
+        """resolve the pending future of each response, fail the rest on close"""
         try:
-            self.ws.send(json.dumps(dict_data))
-            response = self.ws.recv()
+            for response in ws:
+                res = json.loads(response)
+                tag = res.get('customTag')
+                if tag not in pending and pending:
+                    # errors on unparsable requests come back untagged
+                    tag = next(iter(pending))
+                future = pending.pop(tag, None)
+                if future is not None:
+                    future.set_result(res)
         except WebSocketException:
+            pass
+        finally:
+            while pending:
+                _, future = pending.popitem()
+                future.set_exception(SocketError())
+
+    def _submit(self, dict_data):
+        """send command to api without waiting, return a future of the response"""
+        if self.limiter is None:
+            raise NotLogged()
+        self.limiter.wait()
+        tag = str(next(self._tags))
+        future = Future()
+        pending = self._pending
+        pending[tag] = future
+        try:
+            self.ws.send(json.dumps(dict(dict_data, customTag=tag)))
+        except (WebSocketException, AttributeError):
+            pending.pop(tag, None)
+            raise SocketError()
+        return future
+
+    @staticmethod
+    def _result(future):
+        """wait for a submitted command"""
+        try:
+            res = future.result(timeout=REQUEST_TIMEOUT)
+        except TimeoutError:
             raise SocketError()
-        self._time_last_request = time.time()
-        res = json.loads(response)
         if res['status'] is False:
             raise CommandFailed(res)
         if 'returnData' in res.keys():
             return res['returnData']
 
+    def _send_command(self, dict_data):
+        """send command to api"""
+        return self._result(self._submit(dict_data))
+
+    def _send_commands(self, list_data):
+        """send commands back to back, then collect the responses in order"""
+        futures = [self._submit(dict_data) for dict_data in list_data]
+        return [self._result(future) for future in futures]
+
     def _send_command_with_check(self, dict_data):
         """with check login"""
         return self._login_decorator(self._send_command, dict_data)
@@ -169,9 +243,14 @@ class BaseClient(object):
     def login(self, user_id, password, mode='demo'):
         """login command"""
         data = _get_data("login", userId=user_id, password=password)
-        self.ws = connect(f"wss://ws.xtb.com/{mode}")
-        response = self._send_command(data)
+        if self.limiter is None:
+            self.limiter = TokenBucket.for_account(user_id)
+        self._connect(f"wss://ws.xtb.com/{mode}")
+        future = self._submit(data)
+        response = self._result(future)
+        self.stream_session_id = future.result().get('streamSessionId')
         self._login_data = (user_id, password)
+        self.mode = mode
         self.status = STATUS.LOGGED
         return response
 
@@ -203,8 +282,9 @@ class BaseClient(object):
         data = _get_data("getChartLastRequest", info=args)
         return self._send_command_with_check(data)
 
-    def get_chart_range_request(self, symbol, period, start, end, ticks):
-        """getChartRangeRequest command"""
+    @staticmethod
+    def _chart_range_data(symbol, period, start, end, ticks):
+        """checked getChartRangeRequest request"""
         if not isinstance(ticks, int):
             raise ValueError(f"ticks value {ticks} must be int")
         # self._check_login()
@@ -215,9 +295,19 @@ class BaseClient(object):
             "symbol": symbol,
             "ticks": ticks
         }
-        data = _get_data("getChartRangeRequest", info=args)
+        return _get_data("getChartRangeRequest", info=args)
+
+    def get_chart_range_request(self, symbol, period, start, end, ticks):
+        """getChartRangeRequest command"""
+        data = self._chart_range_data(symbol, period, start, end, ticks)
         return self._send_command_with_check(data)
 
+    def get_chart_range_requests(self, requests):
+        """getChartRangeRequest of several (symbol, period, start, end, ticks)
+        sent back to back, the responses in the same order"""
+        return self._send_commands([self._chart_range_data(*request)
+                                    for request in requests])
+
     def get_commission(self, symbol, volume):
         """getCommissionDef command"""
         volume = _check_volume(volume)
@@ -280,19 +370,20 @@ class BaseClient(object):
         data = _get_data("getTradesHistory", end=end, start=start)
         return self._send_command_with_check(data)
 
-    def get_trading_hours(self, trade_position_list):
-        """getTradingHours command"""
-        data = _get_data("getTradingHours", symbols=trade_position_list)
-        response = self._send_command_with_check(data)
+    @staticmethod
+    def _trading_hours_seconds(response):
+        """getTradingHours response with fromT/toT in seconds, in place"""
         for symbol in response:
-            for day in symbol['trading']:
-                day['fromT'] = int(day['fromT'] / 1000)
-                day['toT'] = int(day['toT'] / 1000)
-            for day in symbol['quotes']:
+            for day in symbol['trading'] + symbol['quotes']:
                 day['fromT'] = int(day['fromT'] / 1000)
                 day['toT'] = int(day['toT'] / 1000)
         return response
 
+    def get_trading_hours(self, trade_position_list):
+        """getTradingHours command"""
+        data = _get_data("getTradingHours", symbols=trade_position_list)
+        return self._trading_hours_seconds(self._send_command_with_check(data))
+
     def get_version(self):
         """getVersion command"""
         data = _get_data("getVersion")
@@ -303,9 +394,10 @@ class BaseClient(object):
         data = _get_data("ping")
         self._send_command_with_check(data)
 
-    def trade_transaction(self, symbol, mode, trans_type, volume, stop_loss=0,
-                          take_profit=0, **kwargs):
-        """tradeTransaction command"""
+    @staticmethod
+    def _trade_transaction_data(symbol, mode, trans_type, volume, stop_loss=0,
+                                take_profit=0, **kwargs):
+        """checked tradeTransaction request"""
         # check type
         if trans_type not in [x.value for x in TRANS_TYPES]:
             raise ValueError(f"Type must be in {[x for x in trans_type]}")
@@ -333,10 +425,13 @@ class BaseClient(object):
         }
         info.update(kwargs)  # update with kwargs parameters
         print(f"tradeTransInfo={info}")
-        data = _get_data("tradeTransaction", tradeTransInfo=info)
-        name_of_mode = [x.name for x in MODES if x.value == mode][0]
-        name_of_type = [x.name for x in TRANS_TYPES if x.value ==
-                        trans_type][0]
+        return _get_data("tradeTransaction", tradeTransInfo=info)
+
+    def trade_transaction(self, symbol, mode, trans_type, volume, stop_loss=0,
+                          take_profit=0, **kwargs):
+        """tradeTransaction command"""
+        data = self._trade_transaction_data(symbol, mode, trans_type, volume,
+                                            stop_loss, take_profit, **kwargs)
         return self._send_command_with_check(data)
 
     def trade_transaction_status(self, order_id):
@@ -350,58 +445,52 @@ class BaseClient(object):
         return self._send_command_with_check(data)
 
 
-class Transaction(object):
-    def __init__(self, trans_dict):
-        self._trans_dict = trans_dict
-        self.mode = {0: 'buy', 1: 'sell'}[trans_dict['cmd']]
-        self.order_id = trans_dict['order']
-        self.symbol = trans_dict['symbol']
-        self.volume = trans_dict['volume']
-        self.price = trans_dict['close_price']
-        self.actual_profit = trans_dict['profit']
-        self.timestamp = trans_dict['open_time'] / 1000
-
-
 class Client(BaseClient):
     """advanced class of client"""
 
-    def __init__(self):
-        super().__init__()
-        self.trade_rec = {}
+    def __init__(self, limiter=None):
+        super().__init__(limiter)
+        self.trade_rec = PositionBook()
+        self._trade_stream = None
+        self.trading_hours = TradingHours()
+        self.quotes = {}
+        self.last_timings = {}
+
+    def login(self, user_id, password, mode='demo'):
+        """login command, a new session ends the followed trade stream"""
+        self.trade_rec.live = False
+        return super().login(user_id, password, mode)
 
     def check_if_market_open(self, list_of_symbols):
         """check if market is open for symbol in symbols"""
-        _td = datetime.today()
-        actual_tmsp = _td.hour * 3600 + _td.minute * 60 + _td.second
-        response = self.get_trading_hours(list_of_symbols)
-        market_values = {}
-        for symbol in response:
-            today_values = [day for day in symbol['trading'] if day['day'] ==
-                            _td.isoweekday()]
-            if not today_values:
-                market_values[symbol['symbol']] = False
-                continue
-            today_values = today_values[0]
-            if today_values['fromT'] <= actual_tmsp <= today_values['toT']:
-                market_values[symbol['symbol']] = True
-            else:
-                market_values[symbol['symbol']] = False
-        return market_values
+        self.trading_hours.refresh(self, list_of_symbols)
+        return {symbol: self.trading_hours.is_open(symbol)
+                for symbol in list_of_symbols if symbol in self.trading_hours}
 
-    def get_lastn_candle_history(self, symbol, timeframe_in_seconds, number):
-        """get last n candles of timeframe"""
+    def _get_lastn_chart(self, symbol, timeframe_in_seconds, number):
+        """chart response holding the last n candles of timeframe"""
         acc_tmf = [60, 300, 900, 1800, 3600, 14400, 86400, 604800, 2592000]
         if timeframe_in_seconds not in acc_tmf:
             raise ValueError(f"timeframe not accepted, not in "
                              f"{', '.join([str(x) for x in acc_tmf])}")
-        sec_prior = timeframe_in_seconds * number
-
-        res = {'rateInfos': []}
-        while len(res['rateInfos']) < number:
-            res = self.get_chart_last_request(symbol,
-                                              timeframe_in_seconds // 60, time.time() - sec_prior)
-            res['rateInfos'] = res['rateInfos'][-number:]
-            sec_prior *= 3
+        period = timeframe_in_seconds // 60
+        now = int(time.time())
+        # negative ticks: the n candles up to start, whatever the gaps
+        res = self.get_chart_range_request(symbol, period, now, now, -number)
+        missing = number - len(res['rateInfos'])
+        if missing > 0 and res['rateInfos']:
+            # short answer, page once more from the oldest candle received
+            oldest = res['rateInfos'][0]['ctm']
+            older = self.get_chart_range_request(
+                symbol, period, oldest // 1000, oldest // 1000, -(missing + 1))
+            res['rateInfos'] = [c for c in older['rateInfos']
+                                if c['ctm'] < oldest] + res['rateInfos']
+        res['rateInfos'] = res['rateInfos'][-number:]
+        return res
+
+    def get_lastn_candle_history(self, symbol, timeframe_in_seconds, number):
+        """get last n candles of timeframe"""
+        res = self._get_lastn_chart(symbol, timeframe_in_seconds, number)
         candle_history = []
         for candle in res['rateInfos']:
             _pr = candle['open']
@@ -416,18 +505,74 @@ class Client(BaseClient):
             candle_history.append(new_candle_entry)
         return candle_history
 
+    def get_lastn_candle_columns(self, symbol, timeframe_in_seconds, number):
+        """get last n candles of timeframe as numpy columns,
+        pandas.DataFrame(columns) gives the frame without per candle dicts"""
+        res = self._get_lastn_chart(symbol, timeframe_in_seconds, number)
+        return candle_columns(res)
+
+    def on_tick(self, data):
+        """'tickPrices' stream callback, keeps the top of book per symbol,
+        e.g. stream.on('tickPrices', client.on_tick)"""
+        if data.get('level', 0) == 0:
+            self.quotes[data['symbol']] = (time.monotonic(), data)
+
+    def get_quote(self, symbol, ttl=QUOTE_TTL):
+        """symbol record with 'ask' and 'bid', the streamed or last fetched
+        one when younger than ttl seconds, otherwise from getSymbol"""
+        quote = self.quotes.get(symbol)
+        if quote is not None and time.monotonic() - quote[0] < ttl:
+            return quote[1]
+        data = self.get_symbol(symbol)
+        self.quotes[symbol] = (time.monotonic(), data)
+        return data
+
+    def get_quotes(self, symbols, ttl=QUOTE_TTL):
+        """{symbol: quote} as get_quote gives them, the ones older than ttl
+        refreshed together with one getTickPrices"""
+        now = time.monotonic()
+        stale = [symbol for symbol in symbols if symbol not in self.quotes
+                 or now - self.quotes[symbol][0] >= ttl]
+        if stale:
+            # timestamp 0: the latest tick of every symbol
+            for tick in self.get_tick_prices(stale, 0)['quotations']:
+                self.on_tick(tick)
+        return {symbol: self.get_quote(symbol, ttl) for symbol in symbols}
+
     def update_trades(self):
         """update trade list"""
-        trades = self.get_trades()
-        self.trade_rec.clear()
-        for trade in trades:
-            obj_trans = Transaction(trade)
-            self.trade_rec[obj_trans.order_id] = obj_trans
+        self.trade_rec.sync(self.get_trades())
+        return self.trade_rec
+
+    def refresh_trades(self):
+        """getTrades refresh unless the stream keeps trade_rec current"""
+        if not self.trade_rec.live:
+            self.update_trades()
         return self.trade_rec
 
+    def follow_trades(self, stream):
+        """keep trade_rec current from the 'trade' and 'profit' messages
+        of a connected streaming.StreamClient, until the stream stops or
+        the client logs in again"""
+        stream.on('trade', self.trade_rec.apply)
+        stream.on('profit', self.trade_rec.apply_profit)
+        stream.get_trades()
+        stream.get_profits()
+        self._trade_stream = stream
+        self.trade_rec.live = True
+        # after live is set, so a stream stopping from here on clears it
+        stream.on_close(lambda: self._unfollow_trades(stream))
+        # snapshot after subscribing, so no update falls in between
+        self.update_trades()
+
+    def _unfollow_trades(self, stream):
+        # a replaced stream that stops late leaves its successor followed
+        if stream is self._trade_stream:
+            self.trade_rec.live = False
+
     def get_trade_profit(self, trans_id):
         """get profit of trade"""
-        self.update_trades()
+        self.refresh_trades()
         profit = self.trade_rec[trans_id].actual_profit
         return profit
 
@@ -443,7 +588,10 @@ class Client(BaseClient):
         mode_name = mode.name
         mode_value = mode.value
         conversion_mode = {MODES.BUY.value: 'ask', MODES.SELL.value: 'bid'}
-        price = self.get_symbol(symbol)[conversion_mode[mode_value]]
+        self.last_timings = {}
+        t0 = time.perf_counter()
+        price = self.get_quote(symbol)[conversion_mode[mode_value]]
+        t1 = time.perf_counter()
         # safeguard
         rate_tp = kwargs.pop("rate_tp", 0)
         rate_sl = kwargs.pop("rate_sl", 0)
@@ -456,9 +604,13 @@ class Client(BaseClient):
             sl = price * (1 + rate_sl) if rate_sl else 0
         response = self.trade_transaction(symbol, mode_value, 0, volume,
                                           price=price, take_profit=tp, stop_loss=sl)
-        self.update_trades()
+        t2 = time.perf_counter()
+        # trade_rec is refreshed by its readers (close_trade, get_trade_profit)
         status = self.trade_transaction_status(response['order'])[
             'requestStatus']
+        t3 = time.perf_counter()
+        self.last_timings = {'quote': t1 - t0, 'transaction': t2 - t1,
+                             'status': t3 - t2, 'total': t3 - t0}
         if status != 3:
             raise TransactionRejected(status)
         return response
@@ -487,12 +639,57 @@ class Client(BaseClient):
             order_id = trans.order_id
         else:
             order_id = trans
-        self.update_trades()
+        self.refresh_trades()
         return self._close_trade_only(order_id)
 
+    def close_trades(self, order_ids=None):
+        """close positions (default all) with the close transactions sent
+        back to back and their statuses requested together
+        return: {order_id: response, 'BE51' when already closed or the
+        exception of that order: KeyError for an unknown order,
+        CommandFailed, SocketError or TransactionRejected}"""
+        self.refresh_trades()
+        if order_ids is None:
+            order_ids = list(self.trade_rec)
+        results, requests = {}, {}
+        # check every order before anything is sent
+        for order_id in order_ids:
+            trade = self.trade_rec.get(order_id)
+            if trade is None:
+                results[order_id] = KeyError(order_id)
+                continue
+            try:
+                requests[order_id] = self._trade_transaction_data(
+                    trade.symbol, 0, 2, trade.volume, order=trade.order_id,
+                    price=trade.price)
+            except (ValueError, AssertionError) as e:
+                results[order_id] = e
+        closing = {}
+        for order_id, data in requests.items():
+            try:
+                closing[order_id] = self._submit(data)
+            except SocketError as e:
+                results[order_id] = e
+        statuses = {}
+        for order_id, future in closing.items():
+            try:
+                response = self._result(future)
+                statuses[order_id] = response, self._submit(_get_data(
+                    "tradeTransactionStatus", order=response['order']))
+            except CommandFailed as e:
+                # BE51: order already closed
+                results[order_id] = 'BE51' if e.err_code == 'BE51' else e
+            except SocketError as e:
+                results[order_id] = e
+        for order_id, (response, future) in statuses.items():
+            try:
+                status = self._result(future)['requestStatus']
+            except (CommandFailed, SocketError) as e:
+                results[order_id] = e
+                continue
+            results[order_id] = response if status == 3 else TransactionRejected(status)
+        return {order_id: results[order_id] for order_id in order_ids}
+
     def close_all_trades(self):
-        """close all trades"""
-        self.update_trades()
-        trade_ids = self.trade_rec.keys()
-        for trade_id in trade_ids:
-            self._close_trade_only(trade_id)
+        """close all trades, return: close_trades result map"""
+        return self.close_trades()
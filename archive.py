@@ -0,0 +1,81 @@
+"""
+On-disk candle archive, one append-only file of float64 records per
+(symbol, period), read back through numpy.memmap without copying
+"""
+
+import os
+import time
+import numpy as np
+
+from api import candle_columns
+
+COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+RECORD = len(COLUMNS) * 8
+
+
+class CandleArchive(object):
+    """candles of get_chart_range_request responses, oldest first
+
+    a record is the decoded candle as 6 float64 (timestamp in seconds),
+    so a range of the file maps to a 2-d array and a DataFrame over it
+    shares the mapped memory"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, symbol, period):
+        return os.path.join(self.root, f'{symbol}_{period}.f8')
+
+    def _map(self, symbol, period, mode='r'):
+        path = self.path(symbol, period)
+        if not os.path.exists(path) or os.path.getsize(path) < RECORD:
+            return np.empty((0, len(COLUMNS)))
+        return np.memmap(path, dtype='<f8', mode=mode).reshape(-1, len(COLUMNS))
+
+    def last_timestamp(self, symbol, period):
+        records = self._map(symbol, period)
+        return float(records[-1, 0]) if len(records) else None
+
+    def append(self, symbol, period, chart):
+        """append the candles newer than the archive, the last archived
+        candle is overwritten when it comes again (it may have been forming)
+        return: number of records written"""
+        cols = candle_columns(chart)
+        new = np.column_stack([cols[c] for c in COLUMNS]).astype('<f8')
+        last = self.last_timestamp(symbol, period)
+        if last is not None:
+            new = new[new[:, 0] >= last]
+        if not len(new):
+            return 0
+        path = self.path(symbol, period)
+        with open(path, 'r+b' if last is not None else 'wb') as f:
+            if last is not None and new[0, 0] == last:
+                f.seek(-RECORD, os.SEEK_END)
+            else:
+                f.seek(0, os.SEEK_END)
+            f.write(new.tobytes())
+        return len(new)
+
+    def ingest(self, client, symbol, period, start):
+        """fetch and append candles from the archive end (or start, epoch
+        seconds, when empty) up to now"""
+        last = self.last_timestamp(symbol, period)
+        start = int(last) if last is not None else int(start)
+        res = client.get_chart_range_request(symbol, period, start, int(time.time()), 0)
+        return self.append(symbol, period, res)
+
+    def read(self, symbol, period, start=None, end=None):
+        """(n, 6) float64 view of candles with start <= timestamp <= end"""
+        records = self._map(symbol, period)
+        timestamp = records[:, 0]
+        lo = np.searchsorted(timestamp, start, 'left') if start is not None else 0
+        hi = np.searchsorted(timestamp, end, 'right') if end is not None else len(records)
+        return records[lo:hi]
+
+    def read_frame(self, symbol, period, start=None, end=None):
+        """pandas.DataFrame over read(), no copy of the mapped records"""
+        import pandas as pd
+        # pandas copies an np.memmap, not a plain ndarray view of it
+        return pd.DataFrame(np.asarray(self.read(symbol, period, start, end)),
+                            columns=list(COLUMNS), copy=False)
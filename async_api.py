@@ -0,0 +1,140 @@
+"""
+XTBApi.async_api
+~~~~~~~
+
+asyncio client, same command surface as api.BaseClient
+"""
+
+import asyncio
+import json
+from websockets.client import connect
+from websockets.exceptions import WebSocketException
+
+from api import (BaseClient, CommandFailed, NotLogged, SocketError, STATUS,
+                 REQUEST_TIMEOUT, _get_data)
+from throttle import TokenBucket
+
+
+class AsyncClient(BaseClient):
+    """asyncio client, every command method returns an awaitable
+
+    commands inherited from BaseClient only build their payload and return
+    _send_command_with_check(data), which is a coroutine here"""
+
+    def __init__(self, limiter=None, url='wss://ws.xtb.com'):
+        super().__init__(limiter)
+        self.url = url
+        # the loop only keeps a weak reference to its tasks
+        self._reader = None
+
+    async def _login_decorator(self, func, *args, **kwargs):
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            await self.login(*self._login_data)
+            return await func(*args, **kwargs)
+
+    async def _connect(self, url):
+        """open the socket and start dispatching its responses by customTag"""
+        if self.ws is not None:
+            await self.ws.close()
+        if self._reader is not None:
+            self._reader.cancel()
+        self.ws = await connect(url)
+        self._pending = {}
+        self._reader = asyncio.create_task(self._read_loop(self.ws, self._pending))
+
+    @staticmethod
+    async def _read_loop(ws, pending):
+        """resolve the pending future of each response, fail the rest on close"""
+        try:
+            async for response in ws:
+                res = json.loads(response)
+                tag = res.get('customTag')
+                if tag not in pending and pending:
+                    # errors on unparsable requests come back untagged
+                    tag = next(iter(pending))
+                future = pending.pop(tag, None)
+                if future is not None and not future.done():
+                    future.set_result(res)
+        except WebSocketException:
+            pass
+        finally:
+            while pending:
+                _, future = pending.popitem()
+                if not future.done():
+                    future.set_exception(SocketError())
+
+    async def _submit(self, dict_data):
+        """send command to api without waiting, return a future of the response"""
+        if self.limiter is None:
+            raise NotLogged()
+        await self.limiter.wait_async()
+        tag = str(next(self._tags))
+        future = asyncio.get_running_loop().create_future()
+        pending = self._pending
+        pending[tag] = future
+        try:
+            await self.ws.send(json.dumps(dict(dict_data, customTag=tag)))
+        except (WebSocketException, AttributeError):
+            pending.pop(tag, None)
+            raise SocketError()
+        return future
+
+    @staticmethod
+    async def _result(future):
+        """wait for a submitted command"""
+        try:
+            res = await asyncio.wait_for(future, REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise SocketError()
+        if res['status'] is False:
+            raise CommandFailed(res)
+        if 'returnData' in res.keys():
+            return res['returnData']
+
+    async def _send_command(self, dict_data):
+        """send command to api"""
+        return await self._result(await self._submit(dict_data))
+
+    async def _send_commands(self, list_data):
+        """send commands back to back, then collect the responses in order"""
+        futures = [await self._submit(dict_data) for dict_data in list_data]
+        return [await self._result(future) for future in futures]
+
+    def _send_command_with_check(self, dict_data):
+        """with check login"""
+        return self._login_decorator(self._send_command, dict_data)
+
+    async def login(self, user_id, password, mode='demo'):
+        """login command"""
+        data = _get_data("login", userId=user_id, password=password)
+        if self.limiter is None:
+            self.limiter = TokenBucket.for_account(user_id)
+        await self._connect(f"{self.url}/{mode}")
+        future = await self._submit(data)
+        response = await self._result(future)
+        self.stream_session_id = future.result().get('streamSessionId')
+        self._login_data = (user_id, password, mode)
+        self.mode = mode
+        self.status = STATUS.LOGGED
+        return response
+
+    async def logout(self):
+        """logout command"""
+        data = _get_data("logout")
+        response = await self._send_command(data)
+        await self.ws.close()
+        self._reader.cancel()
+        self.status = STATUS.NOT_LOGGED
+        return response
+
+    async def get_trading_hours(self, trade_position_list):
+        """getTradingHours command"""
+        data = _get_data("getTradingHours", symbols=trade_position_list)
+        return self._trading_hours_seconds(await self._send_command_with_check(data))
+
+    async def ping(self):
+        """ping command"""
+        data = _get_data("ping")
+        await self._send_command_with_check(data)
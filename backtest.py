@@ -0,0 +1,166 @@
+"""
+Backtest, replays archived candles through the strategies' own signal
+functions and simulates Client.open_trade with rate_tp/rate_sl exits
+
+    python backtest.py GOLD EURUSD --period 15 --strategy macd --archive ./archive
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from archive import CandleArchive
+from indicators import strategy as ta_strategy
+
+
+def macd_signals(candles, bar_by_bar=False):
+    """(bar index, mode) where macd_crossover.macd_cross opens a position,
+    bar by bar through macd_cross itself or vectorized on its signal column"""
+    from macd_crossover import macd_cross
+    if bar_by_bar:
+        signals = []
+        for i in range(1, len(candles)):
+            opentx, mode = macd_cross(candles.iloc[i - 1:i + 1])
+            if opentx:
+                signals.append((i, mode))
+        return signals
+    cols = [c for c in candles.columns if c.startswith('MACD') and c.endswith('_A_0')]
+    flag = candles[cols[0]].to_numpy()
+    idx = np.flatnonzero(flag[1:] != flag[:-1]) + 1
+    return [(i, 'buy' if flag[i] > 0 else 'sell') for i in idx]
+
+
+def pullback_signals(candles, bar_by_bar=False):
+    """(bar index, mode) where ema_align_pullback.pullback opens a position,
+    bar by bar through pullback on the current run or in one pass with
+    pullback_series"""
+    from ema_align_pullback import ma_align_frame, pullback, pullback_series
+    candles[['Action', 'Degree']] = ma_align_frame(candles)
+    action, degree = candles['Action'].to_numpy(), candles['Degree'].to_numpy()
+    if not bar_by_bar:
+        return [(i, action[i]) for i in np.flatnonzero(pullback_series(action, degree))]
+    signals, start = [], 0
+    for i in range(len(candles)):
+        if degree[i] == 0:
+            start = i + 1
+        # pullback only looks at the trailing non-zero run
+        opentx, mode = pullback(action[start:i + 1], degree[start:i + 1])
+        if opentx:
+            signals.append((i, mode))
+    return signals
+
+
+def strategy_settings(name):
+    """signal function and default params of a strategy module"""
+    if name == 'macd':
+        import macd_crossover as mod
+        return macd_signals, {'tech': mod.tech, 'rate_tp': mod.rate_tp,
+                              'rate_sl': mod.rate_sl, 'volume': mod.volume}
+    if name == 'pullback':
+        import ema_align_pullback as mod
+        return pullback_signals, {'tech': mod.tech, 'rate_tp': 0, 'rate_sl': 0,
+                                  'volume': 0.1}
+    raise ValueError(f"strategy {name} not in macd, pullback")
+
+
+def _exit(adverse, favourable, sign, sl, tp, start, window=64):
+    """first bar from start whose adverse extreme reaches sl or favourable
+    extreme reaches tp (sl when both), scanned in doubling windows since
+    most trades close long before the end of the history
+    return: (bar index, level) or (None, None)"""
+    n = len(adverse)
+    while start < n:
+        stop = min(start + window, n)
+        hit_sl = sign * (adverse[start:stop] - sl) <= 0 if sl is not None else None
+        hit_tp = sign * (favourable[start:stop] - tp) >= 0 if tp is not None else None
+        hits = [(int(np.argmax(hit)), level) for hit, level in ((hit_sl, sl), (hit_tp, tp))
+                if hit is not None and hit.any()]
+        if hits:
+            j, level = min(hits, key=lambda h: h[0])
+            return start + j, level
+        start, window = stop, window * 2
+    return None, None
+
+
+def simulate(candles, signals, rate_tp=0, rate_sl=0, volume=0.1):
+    """open at the close of each signal bar with open_trade's tp/sl levels,
+    exit on the first later bar whose high/low reaches one of them (sl when
+    both), positions still open are valued at the last close
+    return: list of (bar index, mode, entry, exit, pnl, return), pnl in
+    price units times volume, return relative to the entry price"""
+    close = candles['close'].to_numpy()
+    high = candles['high'].to_numpy()
+    low = candles['low'].to_numpy()
+    # extremes of the rest of the history, a level out of them is never hit
+    rest_low = np.minimum.accumulate(low[::-1])[::-1]
+    rest_high = np.maximum.accumulate(high[::-1])[::-1]
+    trades = []
+    for i, mode in signals:
+        price = close[i]
+        sign = 1 if mode == 'buy' else -1
+        # adverse and favourable extremes for the side
+        adverse, favourable = (low, high) if sign > 0 else (high, low)
+        worst, best = (rest_low, rest_high) if sign > 0 else (rest_high, rest_low)
+        sl = price * (1 - sign * rate_sl) if rate_sl else None
+        tp = price * (1 + sign * rate_tp) if rate_tp else None
+        exit_price = None
+        if i + 1 < len(close) and (sl is not None and sign * (worst[i + 1] - sl) <= 0
+                                   or tp is not None and sign * (best[i + 1] - tp) >= 0):
+            _, exit_price = _exit(adverse, favourable, sign, sl, tp, i + 1)
+        if exit_price is None:
+            exit_price = close[-1]
+        move = sign * (exit_price - price)
+        trades.append((i, mode, price, exit_price, move * volume, move / price))
+    return trades
+
+
+def summary(trades):
+    """trade count, wins, total pnl and total return of simulate()'s trades,
+    only the return compares across symbols of different price scales"""
+    pnl = [t[4] for t in trades]
+    return {'trades': len(trades), 'wins': sum(p > 0 for p in pnl),
+            'pnl': float(sum(pnl)), 'return': float(sum(t[5] for t in trades))}
+
+
+def backtest(symbol, period, name='macd', root='archive', start=None, end=None,
+             bar_by_bar=False, **params):
+    """replay one archived series, params override the strategy settings"""
+    signal_fn, settings = strategy_settings(name)
+    settings.update(params)
+    t0 = time.perf_counter()
+    candles = CandleArchive(root).read_frame(symbol, period, start, end)
+    ta_strategy(candles, settings['tech'])
+    candles = candles.dropna(ignore_index=True)
+    signals = signal_fn(candles, bar_by_bar=bar_by_bar)
+    trades = simulate(candles, signals, settings['rate_tp'], settings['rate_sl'],
+                      settings['volume'])
+    elapsed = time.perf_counter() - t0
+    return {'symbol': symbol, 'period': period, 'strategy': name,
+            'bars': len(candles), **summary(trades), 'seconds': elapsed,
+            'bars_per_s': len(candles) / elapsed if elapsed else 0.}
+
+
+def run(symbols, period, name='macd', root='archive', processes=None, **kwargs):
+    """backtest symbols in parallel, one process per symbol up to all cores"""
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+        futures = [pool.submit(backtest, symbol, period, name, root, **kwargs)
+                   for symbol in symbols]
+        return [future.result() for future in futures]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--period', type=int, default=15)
+    parser.add_argument('--strategy', default='macd', choices=['macd', 'pullback'])
+    parser.add_argument('--archive', default=os.getenv('ARCHIVE_DIR', 'archive'))
+    parser.add_argument('--bar', action='store_true', help='bar by bar replay')
+    args = parser.parse_args()
+    for report in run(args.symbols, args.period, args.strategy, args.archive,
+                      bar_by_bar=args.bar):
+        print(f"{report['symbol']} {report['strategy']}: {report['trades']} trades, "
+              f"{report['wins']} wins, pnl {report['pnl']:.2f}, "
+              f"return {report['return']:.2%}, "
+              f"{report['bars']} bars at {report['bars_per_s']:,.0f} bars/s")
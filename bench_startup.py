@@ -0,0 +1,93 @@
+"""
+Cold-start guard for the strategy entry points, run: python bench_startup.py
+
+Imports each entry module in a fresh `python -X importtime` process, prints
+the slowest top-level imports and exits non-zero when a heavy dependency is
+loaded at import time or the total import time is over budget. Then runs each
+strategy's evaluate() with every market closed, against a stub client and
+without publishing, and fails when that run loads a heavy dependency.
+"""
+
+import subprocess
+import sys
+
+ENTRIES = ['macd_crossover', 'ema_align_pullback', 'daemon']
+STRATEGIES = ['macd_crossover', 'ema_align_pullback']
+HEAVY = ['pandas', 'numpy', 'redis', 'google.cloud.pubsub_v1']
+BUDGET_US = 400_000
+TOP = 10
+# evaluate() of one strategy with every market closed, prints the loaded modules
+CLOSED_RUN = """
+import sys
+import {module} as entry
+
+
+class ClosedClient(object):
+    def check_if_market_open(self, symbols):
+        return dict.fromkeys(symbols, False)
+
+    def get_chart_range_requests(self, requests):
+        return []
+
+
+if hasattr(entry, 'gcp'):
+    entry.gcp.pub = lambda message: None
+entry.evaluate(ClosedClient())
+print(' '.join(sys.modules))
+"""
+
+
+def import_times(module):
+    """{module name: (self us, cumulative us)} of one cold import"""
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                         capture_output=True, text=True)
+    if res.returncode:
+        raise RuntimeError(res.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in res.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # nested imports are indented under their parent
+        times[name[1:].rstrip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def check(module):
+    times = import_times(module)
+    total = sum(self_us for self_us, _ in times.values())
+    loaded = {name.strip() for name in times}
+    heavy = [name for name in HEAVY if name in loaded]
+    print(f'{module}: {total / 1000:.1f} ms, {len(loaded)} modules')
+    # direct imports of the entry module
+    direct = [(c, n.strip()) for n, (_, c) in times.items()
+              if n.startswith('  ') and not n.startswith('    ')]
+    for cumulative_us, name in sorted(direct, reverse=True)[:TOP]:
+        print(f'  {cumulative_us / 1000:8.1f} ms  {name}')
+    failures = []
+    if heavy:
+        failures.append(f'{module} imports {", ".join(heavy)} at import time')
+    if total > BUDGET_US:
+        failures.append(f'{module} import takes {total / 1000:.1f} ms > {BUDGET_US / 1000:.0f} ms')
+    return failures
+
+
+def check_closed(module):
+    res = subprocess.run([sys.executable, '-c', CLOSED_RUN.format(module=module)],
+                         capture_output=True, text=True)
+    if res.returncode:
+        return [f'{module}.evaluate: {res.stderr.strip().splitlines()[-1]}']
+    loaded = set(res.stdout.splitlines()[-1].split())
+    heavy = [name for name in HEAVY if name in loaded]
+    print(f'{module}.evaluate, all markets closed: {len(loaded)} modules')
+    if heavy:
+        return [f'{module}.evaluate loads {", ".join(heavy)} with every market closed']
+    return []
+
+
+if __name__ == '__main__':
+    failures = [f for module in ENTRIES for f in check(module)]
+    failures += [f for module in STRATEGIES for f in check_closed(module)]
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    sys.exit(1 if failures else 0)
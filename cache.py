@@ -0,0 +1,78 @@
+import json
+import os
+import time
+from redis.client import Redis
+
+
+class Cache:
+    """redis connection shared by strategies"""
+
+    def __init__(self, host=None, port=None):
+        self.ttl_s = 604_800
+        self.client = Redis(
+            host=host or os.getenv("REDIS_HOST"),
+            port=port or os.getenv("REDIS_PORT"),
+            decode_responses=True
+        )
+
+    def set_key(self, key, value):
+        self.client.set(key, json.dumps(value), ex=self.ttl_s)
+
+    def get_key(self, key):
+        return json.loads(self.client.get(key))
+
+    def get_keys(self, keys):
+        return [json.loads(s) for s in self.client.mget(keys)]
+
+
+class CandleStore(Cache):
+    """candles of one (symbol, period) kept in a sorted set scored by ctm"""
+
+    @staticmethod
+    def series_key(symbol, period):
+        return f'{symbol}_{period}:candles'
+
+    def add_candles(self, symbol, period, rate_infos, ttl=None):
+        """upsert candles and expire the ones older than ttl, one round trip"""
+        if not rate_infos:
+            return
+        ttl = ttl or self.ttl_s
+        key = self.series_key(symbol, period)
+        newest = max(c['ctm'] for c in rate_infos)
+        pipe = self.client.pipeline(transaction=True)
+        for candle in rate_infos:
+            # the last bar is re-sent while it is forming, replace it
+            pipe.zremrangebyscore(key, candle['ctm'], candle['ctm'])
+        pipe.zadd(key, {json.dumps(c): c['ctm'] for c in rate_infos})
+        pipe.zremrangebyscore(key, '-inf', f'({newest - ttl * 1000}')
+        pipe.expire(key, ttl)
+        pipe.execute()
+
+    def get_candles(self, symbol, period, start='-inf', end='+inf'):
+        """candles with start <= ctm <= end (ms), oldest first"""
+        key = self.series_key(symbol, period)
+        return [json.loads(s) for s in self.client.zrangebyscore(key, start, end)]
+
+    def last_ctm(self, symbol, period):
+        """newest cached ctm (ms) of the series, None when empty"""
+        key = self.series_key(symbol, period)
+        newest = self.client.zrevrange(key, 0, 0, withscores=True)
+        return int(newest[0][1]) if newest else None
+
+    def sync_range(self, symbol, period, backfill=100):
+        """(start, end, ticks) of the chart request that brings the series
+        up to date: bars from the cached high-water mark onwards, the last
+        `backfill` bars when empty or the gap is too wide"""
+        now = int(time.time())
+        last = self.last_ctm(symbol, period)
+        if last is None or now - last // 1000 > backfill * period * 60:
+            return now, now, -backfill
+        # the high-water bar may still have been forming, fetch it again
+        return last // 1000, now, 0
+
+    def sync(self, client, symbol, period, backfill=100):
+        """request only the bars missing from the cache and store them"""
+        res = client.get_chart_range_request(symbol, period,
+                                             *self.sync_range(symbol, period, backfill))
+        self.add_candles(symbol, period, res['rateInfos'])
+        return res
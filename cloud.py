@@ -1,8 +1,8 @@
 import os
-from google.cloud import pubsub_v1
 
 
 def pub(message):
+    from google.cloud import pubsub_v1
     client = pubsub_v1.PublisherClient()
     topic_path = client.topic_path(
         project=os.getenv('GOOGLE_CLOUD_PROJECT'),
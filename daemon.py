@@ -0,0 +1,131 @@
+"""
+Resident scheduler, keeps one logged in client and runs the registered
+strategies in process right after each bar of their period closes
+"""
+
+import os
+import time
+from dotenv import load_dotenv, find_dotenv
+
+from api import Client, CommandFailed, SocketError, _check_period
+from streaming import StreamClient
+
+PING_INTERVAL = 60
+BAR_DELAY = 5
+
+
+class Scheduler(object):
+    """run strategy(client) on the bar boundaries of its period
+
+    open_stream(client), when given, returns a connected StreamClient with
+    its subscriptions. It is called again whenever the stream stopped or
+    belongs to an older session, e.g. after the client relogged."""
+
+    def __init__(self, client, ping_interval=PING_INTERVAL, bar_delay=BAR_DELAY,
+                 open_stream=None):
+        self.client = client
+        self.open_stream = open_stream
+        self.stream = None
+        self.ping_interval = ping_interval
+        self.bar_delay = bar_delay
+        self.jobs = []
+
+    def register(self, period, strategy):
+        """strategy is called with the client every `period` minutes"""
+        _check_period(period)
+        self.jobs.append([self._next_bar(period, time.time()), period, strategy])
+
+    def _next_bar(self, period, now):
+        seconds = period * 60
+        return (now // seconds + 1) * seconds + self.bar_delay
+
+    def run_forever(self):
+        self._check_stream()
+        next_ping = time.time() + self.ping_interval
+        while True:
+            next_at = min([job[0] for job in self.jobs] + [next_ping])
+            time.sleep(max(0., next_at - time.time()))
+            now = time.time()
+            for job in self.jobs:
+                run_at, period, strategy = job
+                if run_at > now:
+                    continue
+                job[0] = self._next_bar(period, now)
+                try:
+                    strategy(self.client)
+                except Exception as e:
+                    # keep the daemon alive, next bar retries
+                    print(f'Exception: {strategy.__module__} {e!r}')
+                next_ping = time.time() + self.ping_interval
+            if time.time() >= next_ping:
+                try:
+                    self.client.ping()
+                except Exception as e:
+                    # keep the daemon alive, the next ping relogs again
+                    print(f'Exception: ping {e!r}')
+                self._check_stream()
+                self._ping_stream()
+                next_ping = time.time() + self.ping_interval
+
+    def _check_stream(self):
+        """reopen the stream when it stopped or the client has a new session"""
+        if self.open_stream is None:
+            return
+        stream = self.stream
+        if (stream is not None and not stream.stopped
+                and stream.session_id == self.client.stream_session_id):
+            return
+        self.close_stream()
+        try:
+            self.stream = self.open_stream(self.client)
+        except Exception as e:
+            # quotes and trades are polled until the next ping retries
+            print(f'Exception: open stream {e!r}')
+
+    def close_stream(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def _ping_stream(self):
+        if self.stream is None or self.stream.stopped:
+            return
+        try:
+            self.stream.ping()
+        except SocketError as e:
+            # the client's trade book falls back to getTrades
+            print(f'Exception: stream ping {e!r}')
+
+
+def open_stream(client, symbols):
+    """stream of the client's current session, quotes of symbols and trades"""
+    stream = StreamClient(client, buffered=False).connect()
+    # streamed quotes let open_trade skip its getSymbol round trip
+    stream.on('tickPrices', client.on_tick)
+    for symbol in symbols:
+        stream.get_tick_prices(symbol)
+    client.follow_trades(stream)
+    return stream
+
+
+def run():
+    import macd_crossover
+    load_dotenv(find_dotenv())
+    client = Client()
+    client.login(os.getenv("RACE_NAME"), os.getenv("RACE_PASS"),
+                 mode=os.getenv("RACE_MODE"))
+    print('Enter the Gate.')
+    scheduler = Scheduler(client, open_stream=lambda c: open_stream(c, macd_crossover.symbols))
+    scheduler.register(15, macd_crossover.evaluate)
+    try:
+        scheduler.run_forever()
+    finally:
+        scheduler.close_stream()
+        try:
+            client.logout()
+        except (CommandFailed, SocketError) as e:
+            print(f'Exception: logout {e!r}')
+
+
+if __name__ == '__main__':
+    run()
@@ -1,31 +1,15 @@
 from api import Client, TransactionRejected
-import pandas as pd
-import pandas_ta as ta
-import json
 import time
 import os
 from dotenv import load_dotenv, find_dotenv
-from redis.client import Redis
+
+# numpy, pandas, redis (cache) and indicators are imported in the functions
+# that need them, a run with every market closed never loads them
 
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 
 
-class Cache:
-    def __init__(self):
-        self.ttl_s = 604_800
-        self.client = Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
-
-    def set_key(self, key, value):
-        self.client.set(key, json.dumps(value), ex=self.ttl_s)
-
-    def get_key(self, key):
-        return json.loads(self.client.get(key))
-
-    def get_keys(self, keys):
-        return [json.loads(s) for s in self.client.mget(keys)]
-
-
 def ma_align(row):
     """As row function, takes pandas.series.Series or dictionaries contain 'close' and 'EMA_X' keys,
     return: (str)EMA_trend_action, (int)degree_of_price_among_EMA.
@@ -53,53 +37,89 @@ def ma_align(row):
     return {'Action': action, 'Degree': degree}
 
 
+def ma_align_frame(df):
+    """Vectorized ma_align, takes pandas.DataFrame contains 'close' and 'EMA_X' columns,
+    return: pandas.DataFrame of 'Action' and 'Degree' columns, row for row equal to ma_align.
+    """
+    import numpy as np
+    import pandas as pd
+    ma_cols = sorted((int(n.split('_')[-1]), n) for n in df.columns.to_list() if 'MA_' in n)
+    list_ma = df[[k for i, k in ma_cols]].to_numpy(dtype=float)
+    close = df['close'].to_numpy(dtype=float)[:, None]
+    steps = np.diff(list_ma, axis=1)
+    is_sorted = (steps >= 0).all(axis=1)
+    is_rsorted = (steps <= 0).all(axis=1)
+    # position of close among the MAs = number of MAs strictly beyond it
+    action = np.where(is_rsorted, 'buy', np.where(is_sorted, 'sell', 'stay'))
+    degree = np.where(is_rsorted, (list_ma > close).sum(axis=1),
+                      np.where(is_sorted, -(list_ma < close).sum(axis=1), 0))
+    return pd.DataFrame({'Action': action, 'Degree': degree}, index=df.index)
+
+
+def pullback(action, degree):
+    """As evaluate function, takes numpy arrays of 'Action' and 'Degree' oldest first,
+    return: (bool)whether_to_open_position, (str)mode_buy_or_sell.
+    note: opens when the trailing run of non-zero Degree has exactly one shoulder,
+    a point at least 2 degrees from the run's peak, after the peak.
+    """
+    import numpy as np
+    # trailing run of non-zero degree, latest first
+    rev = np.asarray(degree)[::-1]
+    zeros = np.flatnonzero(rev == 0)
+    run = rev[:zeros[0]] if zeros.size else rev
+    if not run.size:
+        return False, 'stay'
+    # whether current point just rebound
+    idx_peak = np.argmax(np.abs(run))
+    shoulder = np.abs(run[idx_peak] - run[:idx_peak]) >= 2
+    return bool(np.count_nonzero(shoulder) == 1), action[-1]
+
+
+def pullback_series(action, degree):
+    """Incremental pullback, takes numpy arrays of 'Action' and 'Degree' oldest first,
+    return: numpy bool array, element i equal to pullback(action[:i + 1], degree[:i + 1])[0].
+    note: O(1) per bar, keeps the run's latest peak and the shoulders after it.
+    """
+    import numpy as np
+    opens = np.zeros(len(degree), dtype=bool)
+    peak, shoulders = 0, 0
+    for i, d in enumerate(np.asarray(degree).tolist()):
+        if d == 0:
+            peak, shoulders = 0, 0
+        elif abs(d) >= abs(peak):
+            # the latest bar at the run's max |degree| is the peak
+            peak, shoulders = d, 0
+        else:
+            shoulders += abs(peak - d) >= 2
+        opens[i] = d != 0 and shoulders == 1
+    return opens
+
+
 def indicator_signal(client, symbol, tech):
+    import pandas as pd
+    from cache import CandleStore
+    from indicators import strategy
     # get charts
     period = 15
     now = int(time.time())
-    res = client.get_chart_range_request(symbol, period, now, now, -100)
-    rate_infos = res['rateInfos']
-    print(f'Info: recv {symbol} {len(rate_infos)} ticks.')
-    # caching
-    cache = Cache()
-    for ctm in rate_infos:
-        cache.set_key(f'{symbol}_{period}:{ctm["ctm"]}', ctm)
-    ctm_prefix = range(((now - 360_000) // 100_000), (now // 100_000)+1)
-    rate_infos = []
-    for pre in ctm_prefix:
-        mkey = cache.client.keys(pattern=f'{symbol}_{period}:{pre}*')
-        rate_infos.extend(cache.get_keys(mkey))
+    store = CandleStore(host=REDIS_HOST, port=REDIS_PORT)
+    res = store.sync(client, symbol, period)
+    print(f'Info: recv {symbol} {len(res["rateInfos"])} ticks.')
+    rate_infos = store.get_candles(symbol, period, start=(now - 360_000) // 100_000 * 100_000_000)
     # tech calculation
-    rate_infos.sort(key=lambda x: x['ctm'])
     candles = pd.DataFrame(rate_infos)
     candles['close'] = candles['close'] + candles['open']
     print(f'Info: got {symbol} {len(candles)} ticks.')
-    ta_strategy = ta.Strategy(
-        name="Multi-Momo",
-        description="EMA 25,50,100,200",
-        ta=tech,
-    )
-    candles.ta.strategy(ta_strategy)
+    strategy(candles, tech)
     # clean
     candles.dropna(inplace=True, ignore_index=True)
     print(f'Info: cleaned {symbol} {len(candles)} ticks.')
     # evaluate trend alignment
-    candles[['Action', 'Degree']] = pd.DataFrame(candles.apply(ma_align, axis=1).values.tolist())
+    candles[['Action', 'Degree']] = ma_align_frame(candles)
     print(f'Info: processed {symbol} {len(candles)} ticks.')
     # candles.to_csv(f'candles_{symbol}.csv')
     # filter last run trend
-    df = candles[::-1]
-    fltr = [cur := True] and [cur := bool(cur * i) for i in df['Degree'].values.tolist()]
-    opentx, mode = False, 'stay'
-    if sum(fltr):
-        mode = df[fltr]['Action'].values.tolist()[0]
-        degree = df[fltr]['Degree'].values.tolist()
-        # whether current point just rebound
-        peak = max(degree, key=abs)
-        idx_peak = degree.index(peak)
-        shoulder = [abs(peak - v) >= 2 for i, v in enumerate(degree) if i < idx_peak]
-        opentx = sum(shoulder) == 1
-    return opentx, mode
+    return pullback(candles['Action'].to_numpy(), candles['Degree'].to_numpy())
 
 
 def trigger_open_trade(client, symbol, mode='buy', volume=0.1):
@@ -137,11 +157,8 @@ symbols = settings.get('symbols')
 tech = settings.get('tech')
 
 
-def run():
-    client = Client()
-    client.login(racer['name'], racer['shield'], mode=racer['action'])
-    print('Enter the Gate.')
-
+def evaluate(client):
+    """one evaluation pass on a logged in client"""
     # Check if market is open
     market_status = client.check_if_market_open(symbols)
     print(f'Ready: {market_status}')
@@ -154,6 +171,12 @@ def run():
             # trigger_open_trade(client, symbol=symbol, mode=mode)
             print(f'Open: [{symbol}, {mode}]')
 
+
+def run():
+    client = Client()
+    client.login(racer['name'], racer['shield'], mode=racer['action'])
+    print('Enter the Gate.')
+    evaluate(client)
     client.logout()
 
 
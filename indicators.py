@@ -0,0 +1,258 @@
+"""
+Technical indicators for the strategies' `tech` settings, e.g.
+[{"kind": "ema", "length": 8}, {"kind": "macd", "fast": 8, "slow": 21}],
+named and seeded like pandas-ta: EMA_8, SMA_20, MACD_8_21_9, ...
+
+strategy() computes whole columns at once, IndicatorState updates the
+same values bar by bar
+"""
+
+import copy
+import math
+import numpy as np
+import pandas as pd
+
+NAN = float('nan')
+# stored IndicatorState layout, states of another version are recomputed
+STATE_VERSION = 1
+
+
+def ema(close, length=10):
+    """EMA of a 1-d array, the first value is the SMA of `length` values"""
+    close = np.array(close, dtype=float)
+    if len(close) < length:
+        return np.full(len(close), NAN)
+    close[length - 1] = close[:length].mean()
+    close[:length - 1] = NAN
+    return pd.Series(close).ewm(span=length, adjust=False).mean().to_numpy()
+
+
+def sma(close, length=10):
+    """rolling mean of a 1-d array over `length` values"""
+    close = np.asarray(close, dtype=float)
+    out = np.full(len(close), NAN)
+    if len(close) >= length:
+        out[length - 1:] = np.lib.stride_tricks.sliding_window_view(close, length).mean(axis=1)
+    return out
+
+
+def macd(close, fast=12, slow=26, signal=9, signal_indicators=False):
+    """dict of MACD line, histogram, signal and optionally pandas-ta's
+    signal columns: histogram crossing 0 (_XA_0, _XB_0), MACD above 0 (_A_0)"""
+    if slow < fast:
+        fast, slow = slow, fast
+    name = f'{fast}_{slow}_{signal}'
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = np.full(len(line), NAN)
+    valid = np.flatnonzero(~np.isnan(line))
+    if valid.size:
+        signal_line[valid[0]:] = ema(line[valid[0]:], signal)
+    hist = line - signal_line
+    columns = {f'MACD_{name}': line, f'MACDh_{name}': hist,
+               f'MACDs_{name}': signal_line}
+    if signal_indicators:
+        # pandas-ta cross_value and above_value, NaN compares as False
+        with np.errstate(invalid='ignore'):
+            above = hist > 0
+            below_before = np.concatenate([[False], hist[:-1] < 0])
+            columns[f'MACDh_{name}_XA_0'] = (above & below_before).astype(int)
+            columns[f'MACDh_{name}_XB_0'] = (~above & ~below_before).astype(int)
+            columns[f'MACD_{name}_A_0'] = (line >= 0).astype(int)
+    return columns
+
+
+def strategy(df, tech):
+    """append the `tech` indicator columns on df['close'], like
+    df.ta.strategy(ta.Strategy(ta=tech)) with the same column names"""
+    close = df['close'].to_numpy(dtype=float)
+    for ind in tech:
+        kind = ind['kind']
+        if kind == 'ema':
+            df[f"EMA_{ind.get('length', 10)}"] = ema(close, ind.get('length', 10))
+        elif kind == 'sma':
+            df[f"SMA_{ind.get('length', 10)}"] = sma(close, ind.get('length', 10))
+        elif kind == 'macd':
+            for col, values in macd(close, ind.get('fast', 12), ind.get('slow', 26),
+                                    ind.get('signal', 9),
+                                    ind.get('signal_indicators', False)).items():
+                df[col] = values
+        else:
+            raise ValueError(f"indicator kind {kind} not supported")
+    return df
+
+
+class EMAState(object):
+    """recursive EMA, seeded with the SMA of the first `length` values"""
+
+    def __init__(self, length, count=0, total=0., value=NAN):
+        self.length = length
+        self.alpha = 2 / (length + 1)
+        self.count = count
+        self.total = total
+        self.value = value
+
+    def update(self, x):
+        self.count += 1
+        if self.count < self.length:
+            self.total += x
+        elif self.count == self.length:
+            self.value = (self.total + x) / self.length
+        else:
+            self.value = self.alpha * x + (1 - self.alpha) * self.value
+        return self.value
+
+    def to_dict(self):
+        return {'count': self.count, 'total': self.total, 'value': self.value}
+
+
+class SMAState(object):
+    """rolling mean over the last `length` values"""
+
+    def __init__(self, length, window=None, total=0.):
+        self.length = length
+        self.window = window or []
+        self.total = total
+
+    def update(self, x):
+        self.window.append(x)
+        self.total += x
+        if len(self.window) > self.length:
+            self.total -= self.window.pop(0)
+        return self.total / self.length if len(self.window) == self.length else NAN
+
+    def to_dict(self):
+        return {'window': self.window, 'total': self.total}
+
+
+class MACDState(object):
+    """MACD line, histogram and signal EMA of the line once it is valid,
+    the previous histogram is kept for the cross flags"""
+
+    def __init__(self, fast, slow, signal, signal_indicators=False, states=None):
+        if slow < fast:
+            fast, slow = slow, fast
+        self.name = f'{fast}_{slow}_{signal}'
+        self.signal_indicators = signal_indicators
+        states = states or {}
+        self.fast = EMAState(fast, **states.get('fast', {}))
+        self.slow = EMAState(slow, **states.get('slow', {}))
+        self.signal = EMAState(signal, **states.get('signal', {}))
+        self.hist = states.get('hist', NAN)
+
+    def update(self, x):
+        macd = self.fast.update(x) - self.slow.update(x)
+        signal = self.signal.update(macd) if not math.isnan(macd) else NAN
+        hist, prev_hist = macd - signal, self.hist
+        self.hist = hist
+        row = {f'MACD_{self.name}': macd,
+               f'MACDh_{self.name}': hist,
+               f'MACDs_{self.name}': signal}
+        if self.signal_indicators:
+            # pandas-ta cross_value and above_value, NaN compares as False
+            above, below_before = hist > 0, prev_hist < 0
+            row[f'MACDh_{self.name}_XA_0'] = int(above and below_before)
+            row[f'MACDh_{self.name}_XB_0'] = int(not above and not below_before)
+            row[f'MACD_{self.name}_A_0'] = int(macd >= 0)
+        return row
+
+    def to_dict(self):
+        return {'fast': self.fast.to_dict(), 'slow': self.slow.to_dict(),
+                'signal': self.signal.to_dict(), 'hist': self.hist}
+
+
+def _state(ind, states=None):
+    """state object of one `tech` entry"""
+    states = states or {}
+    kind = ind['kind']
+    if kind == 'ema':
+        return f"EMA_{ind.get('length', 10)}", EMAState(ind.get('length', 10), **states)
+    if kind == 'sma':
+        return f"SMA_{ind.get('length', 10)}", SMAState(ind.get('length', 10), **states)
+    if kind == 'macd':
+        return None, MACDState(ind.get('fast', 12), ind.get('slow', 26),
+                               ind.get('signal', 9),
+                               ind.get('signal_indicators', False), states)
+    raise ValueError(f"indicator kind {kind} not supported")
+
+
+class IndicatorState(object):
+    """incremental indicators of one (symbol, period) series
+
+    keeps the recursive state as of the last closed bar, so each new bar
+    costs O(1). run() replays from scratch when the stored state cannot
+    be chained to the candles it is given."""
+
+    def __init__(self, tech, data=None):
+        data = data or {}
+        self.tech = tech
+        self.last_ctm = data.get('last_ctm')
+        self.last_row = data.get('last_row')
+        states = data.get('states') or [None] * len(tech)
+        self._states = [_state(ind, st) for ind, st in zip(tech, states)]
+
+    @staticmethod
+    def cache_key(symbol, period):
+        return f'{symbol}_{period}:ta'
+
+    @classmethod
+    def load(cls, cache, symbol, period, tech):
+        """stored state, a fresh one when missing, made for other settings
+        or by another version"""
+        try:
+            data = cache.get_key(cls.cache_key(symbol, period))
+        except TypeError:
+            return cls(tech)
+        if data.get('tech') != json_tech(tech) or data.get('version') != STATE_VERSION:
+            return cls(tech)
+        return cls(tech, data)
+
+    def save(self, cache, symbol, period):
+        cache.set_key(self.cache_key(symbol, period), self.to_dict())
+
+    def to_dict(self):
+        return {'version': STATE_VERSION, 'tech': json_tech(self.tech),
+                'last_ctm': self.last_ctm,
+                'last_row': self.last_row,
+                'states': [st.to_dict() for _, st in self._states]}
+
+    def update(self, ctm, close):
+        """commit one closed bar, return its indicator row"""
+        row = {'ctm': ctm}
+        for name, st in self._states:
+            value = st.update(close)
+            if name is None:
+                row.update(value)
+            else:
+                row[name] = value
+        self.last_ctm, self.last_row = ctm, row
+        return row
+
+    def peek(self, ctm, close):
+        """indicator row of a bar that may still change, state untouched"""
+        return copy.deepcopy(self).update(ctm, close)
+
+    def run(self, ctm, close):
+        """rows for the bars after the stored state, the last bar is not
+        committed since it may still be forming
+
+        ctm and close are sequences oldest first, the previous row is
+        prepended so the result holds at least the latest two bars"""
+        ctm, close = [int(c) for c in ctm], [float(c) for c in close]
+        if self.last_ctm in ctm:
+            start = ctm.index(self.last_ctm) + 1
+            rows = [self.last_row]
+        else:
+            # gap or no state, full recompute
+            self.__init__(self.tech)
+            start, rows = 0, []
+        for i in range(start, len(ctm) - 1):
+            rows.append(self.update(ctm[i], close[i]))
+        if start < len(ctm):
+            rows.append(self.peek(ctm[-1], close[-1]))
+        return rows
+
+
+def json_tech(tech):
+    """tech settings as they read back from json, for comparison"""
+    return [{k: list(v) if isinstance(v, tuple) else v for k, v in ind.items()}
+            for ind in tech]
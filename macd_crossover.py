@@ -1,15 +1,14 @@
-from api import Client, TransactionRejected
-import pandas as pd
-import pandas_ta as ta
-import json
+from api import Client, CommandFailed, SocketError, TransactionRejected
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv, find_dotenv
-from redis.client import Redis
-from redis.exceptions import ConnectionError
 import cloud as gcp
 
+# pandas, numpy and redis are imported in the functions that need them,
+# a run with every market closed never loads them (see bench_startup.py)
+
 # Settings.json
 settings = {
     'symbols': ['GOLD', 'GBPUSD', 'EURUSD'],
@@ -24,6 +23,7 @@ settings = {
     'volume': 0.1,
     'rate_tp': 0.2,
     'rate_sl': 0.1,
+    'workers': 4,
 }
 
 # Initial connection
@@ -31,30 +31,13 @@ load_dotenv(find_dotenv())
 r_name = os.getenv("RACE_NAME")
 r_pass = os.getenv("RACE_PASS")
 r_mode = os.getenv("RACE_MODE")
+archive_dir = os.getenv("ARCHIVE_DIR")
 symbols = settings.get('symbols')
 tech = settings.get('tech')
 volume = settings.get('volume')
 rate_tp = settings.get('rate_tp')
 rate_sl = settings.get('rate_sl')
-
-
-class Cache:
-    def __init__(self):
-        self.ttl_s = 604_800
-        self.client = Redis(
-            host=os.getenv("REDIS_HOST"),
-            port=os.getenv("REDIS_PORT"),
-            decode_responses=True
-        )
-
-    def set_key(self, key, value):
-        self.client.set(key, json.dumps(value), ex=self.ttl_s)
-
-    def get_key(self, key):
-        return json.loads(self.client.get(key))
-
-    def get_keys(self, keys):
-        return [json.loads(s) for s in self.client.mget(keys)]
+workers = settings.get('workers')
 
 
 def macd_cross(df):
@@ -71,36 +54,85 @@ def macd_cross(df):
     return opentx, mode
 
 
-def indicator_signal(client, symbol):
-    # get charts
-    period = 15
+def fetch_candles(client, symbol, period=15):
+    """I/O part of the signal: sync the cache with XTB and read back the window"""
+    from redis.exceptions import ConnectionError
+    from cache import CandleStore
     now = int(time.time())
-    res = client.get_chart_range_request(symbol, period, now, now, -100)
-    digits = res['digits']
-    rate_infos = res['rateInfos']
-    print(f'Info: recv {symbol} {len(rate_infos)} ticks.')
-    # caching
     try:
-        cache = Cache()
-        for ctm in rate_infos:
-            cache.set_key(f'{symbol}_{period}:{ctm["ctm"]}', ctm)
-        ctm_prefix = range(((now - 360_000) // 100_000), (now // 100_000)+1)
-        rate_infos = []
-        for pre in ctm_prefix:
-            mkey = cache.client.keys(pattern=f'{symbol}_{period}:{pre}*')
-            rate_infos.extend(cache.get_keys(mkey))
+        store = CandleStore()
+        res = store.sync(client, symbol, period)
+        print(f'Info: recv {symbol} {len(res["rateInfos"])} ticks.')
+        rate_infos = store.get_candles(symbol, period, start=(now - 360_000) // 100_000 * 100_000_000)
     except ConnectionError as e:
         print(e)
+        res = client.get_chart_range_request(symbol, period, now, now, -100)
+        rate_infos = res['rateInfos']
+        print(f'Info: recv {symbol} {len(rate_infos)} ticks.')
+    if archive_dir:
+        from archive import CandleArchive
+        CandleArchive(archive_dir).append(symbol, period, res)
+    return rate_infos, res['digits']
+
+
+def fetch_all_candles(client, symbols, period=15):
+    """fetch_candles of several symbols, the chart requests sent back to back
+    and collected afterwards, yields (symbol, rate_infos, digits) in order"""
+    from redis.exceptions import ConnectionError
+    from cache import CandleStore
+    now = int(time.time())
+    store = CandleStore()
+    try:
+        ranges = [store.sync_range(symbol, period) for symbol in symbols]
+    except ConnectionError as e:
+        print(e)
+        store, ranges = None, [(now, now, -100)] * len(symbols)
+    try:
+        charts = client.get_chart_range_requests(
+            [(symbol, period, *r) for symbol, r in zip(symbols, ranges)])
+    except (CommandFailed, SocketError) as e:
+        # one at a time, through the client's relogin
+        print(f'Exception: pipelined charts {e!r}')
+        for symbol in symbols:
+            yield (symbol, *fetch_candles(client, symbol, period))
+        return
+    for symbol, res in zip(symbols, charts):
+        print(f'Info: recv {symbol} {len(res["rateInfos"])} ticks.')
+        rate_infos = res['rateInfos']
+        if store is not None:
+            try:
+                store.add_candles(symbol, period, rate_infos)
+                rate_infos = store.get_candles(
+                    symbol, period, start=(now - 360_000) // 100_000 * 100_000_000)
+            except ConnectionError as e:
+                print(e)
+        if archive_dir:
+            from archive import CandleArchive
+            CandleArchive(archive_dir).append(symbol, period, res)
+        yield symbol, rate_infos, res['digits']
+
+
+def compute_signal(symbol, rate_infos, digits, period=15):
+    """CPU part of the signal, no client access so it can run in a worker"""
+    import pandas as pd
+    from redis.exceptions import ConnectionError
+    from cache import CandleStore
+    from indicators import IndicatorState
     # tech calculation
     rate_infos.sort(key=lambda x: x['ctm'])
     candles = pd.DataFrame(rate_infos)
     candles['close'] = (candles['close'] + candles['open']) / 10 ** digits
     print(f'Info: got {symbol} {len(candles)} ticks.')
-    ta_strategy = ta.Strategy(
-        name="Multi-Momo",
-        ta=tech,
-    )
-    candles.ta.strategy(ta_strategy)
+    # incremental indicators, only bars after the stored state are computed
+    try:
+        store = CandleStore()
+        state = IndicatorState.load(store, symbol, period, tech)
+        rows = state.run(candles['ctm'], candles['close'])
+        state.save(store, symbol, period)
+    except ConnectionError as e:
+        print(e)
+        rows = IndicatorState(tech).run(candles['ctm'], candles['close'])
+    candles = candles.merge(pd.DataFrame(rows), on='ctm')
     # clean
     candles.dropna(inplace=True, ignore_index=True)
     epoch_ms = candles.iloc[-1]['ctm']
@@ -110,6 +142,24 @@ def indicator_signal(client, symbol):
     return candles, {"epoch_ms": epoch_ms, "open": opentx, "mode": mode}
 
 
+def indicator_signal(client, symbol):
+    rate_infos, digits = fetch_candles(client, symbol)
+    return compute_signal(symbol, rate_infos, digits)
+
+
+def gather_signals(client, symbols_open):
+    """send the chart requests of all symbols back to back as the client
+    throttle allows, then run the TA of each in the pool as it is stored"""
+    if not symbols_open:
+        # all closed, keep redis, cache and pandas unloaded
+        return {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for symbol, rate_infos, digits in fetch_all_candles(client, list(symbols_open)):
+            futures[symbol] = pool.submit(compute_signal, symbol, rate_infos, digits)
+        return {symbol: future.result() for symbol, future in futures.items()}
+
+
 class Notify:
     def __init__(self):
         self.ts = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
@@ -132,21 +182,16 @@ def trigger_open_trade(client, symbol, mode='buy'):
         return e
 
 
-def run():
-    client = Client()
-    client.login(r_name, r_pass, mode=r_mode)
+def evaluate(client):
+    """one evaluation pass on a logged in client"""
     notify = Notify()
-    print('Enter the Gate.')
-
     # Check if market is open
     market_status = client.check_if_market_open(symbols)
     msg = notify.add(f'Market status: {market_status}')
     print(msg)
-    for symbol in market_status.keys():
-        if not market_status[symbol]:
-            continue
-        # Market open, check signal
-        df, signal = indicator_signal(client, symbol)
+    # Market open, check signals of all open symbols before trading
+    signals = gather_signals(client, [s for s, is_open in market_status.items() if is_open])
+    for symbol, (df, signal) in signals.items():
         close = df.iloc[-1]['close']
         opentx = signal.get("open")
         mode = signal.get("mode")
@@ -159,9 +204,16 @@ def run():
             res = trigger_open_trade(client, symbol=symbol, mode=mode)
             msg = notify.add(f'>> Open: {symbol}, {ts}, {mode}, {volume}, {res}')
             print(msg)
+            print(f'Timing: {symbol} open_trade {client.last_timings}')
+    gcp.pub(notify.notes)
 
+
+def run():
+    client = Client()
+    client.login(r_name, r_pass, mode=r_mode)
+    print('Enter the Gate.')
+    evaluate(client)
     client.logout()
-    gcp.pub(notify.notes)
 
 
 if __name__ == '__main__':
@@ -476,7 +476,6 @@ class Client(BaseClient):
 
 
 import pandas as pd
-import pandas_ta as ta
 import firebase_admin as fba
 from firebase_admin import firestore
 
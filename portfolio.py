@@ -0,0 +1,103 @@
+"""
+Local risk figures of the open positions, unrealized PnL, exposure and
+margin computed in one vectorized pass from cached getSymbol records and
+the client's quotes (streamed, or all refreshed by one getTickPrices)
+instead of getTrades/getProfitCalculation round trips
+"""
+
+import time
+import numpy as np
+import pandas as pd
+
+SPEC_TTL = 3600
+# symbol record fields used by the engine
+SPEC_FIELDS = ('contractSize', 'tickSize', 'tickValue', 'leverage', 'currencyProfit')
+
+
+class Portfolio(object):
+    """PnL, exposure and margin of client.trade_rec
+
+    per lot, a price move is worth tickValue / tickSize in the account
+    currency, and margin is the notional times leverage percent, as in
+    XTB's symbol records. Positions are marked at bid for buys and ask
+    for sells, the price they would close at."""
+
+    def __init__(self, client, spec_ttl=SPEC_TTL):
+        self.client = client
+        self.spec_ttl = spec_ttl
+        self.specs = {}
+
+    def _store(self, record):
+        # a symbol record is also a quote
+        now = time.monotonic()
+        self.specs[record['symbol']] = (now, record)
+        self.client.quotes[record['symbol']] = (now, record)
+        return record
+
+    def load_specs(self):
+        """cache the specs of every symbol with one getAllSymbols"""
+        for record in self.client.get_all_symbols():
+            self._store(record)
+
+    def spec(self, symbol):
+        """cached symbol record, refetched with getSymbol after spec_ttl"""
+        cached = self.specs.get(symbol)
+        if cached is not None and time.monotonic() - cached[0] < self.spec_ttl:
+            return cached[1]
+        return self._store(self.client.get_symbol(symbol))
+
+    def _symbol_columns(self, symbols):
+        """spec fields and bid/ask of each symbol as arrays"""
+        specs = [self.spec(symbol) for symbol in symbols]
+        quotes = list(self.client.get_quotes(list(symbols)).values())
+        columns = {field: np.array([spec[field] for spec in specs])
+                   for field in SPEC_FIELDS}
+        columns['bid'] = np.array([quote['bid'] for quote in quotes], dtype=float)
+        columns['ask'] = np.array([quote['ask'] for quote in quotes], dtype=float)
+        return columns
+
+    def positions(self, refresh=True):
+        """pandas.DataFrame of the positions with their mark, pnl, signed
+        exposure and margin in the account currency, and notional in the
+        symbol's profit currency"""
+        if refresh:
+            self.client.refresh_trades()
+        table = self.client.trade_rec.to_array()
+        df = pd.DataFrame(table)
+        if not len(table):
+            return df.assign(mark=[], notional=[], pnl=[], exposure=[], margin=[],
+                             currencyProfit=[])
+        symbols, inverse = np.unique(table['symbol'], return_inverse=True)
+        columns = {k: v[inverse] for k, v in self._symbol_columns(symbols).items()}
+        side = table['side'].astype(float)
+        mark = np.where(side > 0, columns['bid'], columns['ask'])
+        value_per_point = columns['tickValue'] / columns['tickSize'] * table['volume']
+        notional = table['volume'] * columns['contractSize'] * mark
+        df['mark'] = mark
+        df['notional'] = notional
+        df['pnl'] = side * (mark - table['open_price']) * value_per_point
+        df['exposure'] = side * mark * value_per_point
+        df['margin'] = mark * value_per_point * columns['leverage'] / 100
+        df['currencyProfit'] = columns['currencyProfit']
+        return df
+
+    def by_symbol(self, positions=None):
+        """per symbol net and gross exposure, margin and pnl"""
+        df = self.positions() if positions is None else positions
+        df = df.assign(gross=df['exposure'].abs())
+        return df.groupby('symbol')[['exposure', 'gross', 'margin', 'pnl', 'volume']].sum()
+
+    def totals(self, positions=None):
+        """account wide exposure, margin and pnl"""
+        df = self.positions() if positions is None else positions
+        return {'exposure': float(df['exposure'].sum()),
+                'gross': float(df['exposure'].abs().sum()),
+                'margin': float(df['margin'].sum()),
+                'pnl': float(df['pnl'].sum()),
+                'positions': len(df)}
+
+    def margin(self, symbol, volume, mode='buy'):
+        """margin a new position would take, for checks before an entry"""
+        spec, quote = self.spec(symbol), self.client.get_quotes([symbol])[symbol]
+        price = quote['ask'] if mode == 'buy' else quote['bid']
+        return price / spec['tickSize'] * spec['tickValue'] * volume * spec['leverage'] / 100
@@ -0,0 +1,140 @@
+"""
+Open positions of an account, kept in sync from getTrades snapshots or the
+'trade' stream instead of being rebuilt on every refresh
+"""
+
+import threading
+from collections.abc import Mapping
+
+# tradeRecord cmd of market positions, pending orders are not kept
+SIDES = {0: 'buy', 1: 'sell'}
+# streaming trade record types that end a position
+CLOSE, DELETE = 2, 4
+# PositionBook.to_array() record
+DTYPE = [('order_id', 'i8'), ('symbol', 'U16'), ('side', 'i1'), ('volume', 'f8'),
+         ('open_price', 'f8'), ('price', 'f8'), ('actual_profit', 'f8'),
+         ('timestamp', 'f8')]
+
+
+class Transaction(object):
+    """fields of one trade record, updated in place by later records"""
+    __slots__ = ('mode', 'order_id', 'symbol', 'volume', 'open_price', 'price',
+                 'actual_profit', 'timestamp')
+
+    def __init__(self, trans_dict):
+        self.mode = SIDES[trans_dict['cmd']]
+        self.order_id = trans_dict['order']
+        self.symbol = trans_dict['symbol']
+        self.update(trans_dict)
+
+    def update(self, trans_dict):
+        self.volume = trans_dict['volume']
+        self.open_price = trans_dict['open_price']
+        self.price = trans_dict['close_price']
+        self.actual_profit = trans_dict['profit']
+        self.timestamp = trans_dict['open_time'] / 1000
+
+
+class PositionBook(Mapping):
+    """{order_id: Transaction} of the open positions, also indexed by
+    symbol and side, e.g. book.by_symbol('GOLD', 'buy')
+
+    sync() diffs a full getTrades response, apply() and apply_profit()
+    take one streamed 'trade' and 'profit' record. `live` tells readers
+    the book follows the stream and needs no getTrades refresh.
+
+    stream callbacks run on the stream's reader thread, so updates hold a
+    lock and readers iterate over copies"""
+
+    def __init__(self):
+        self._orders = {}
+        self._index = {}
+        self._lock = threading.Lock()
+        self.live = False
+
+    def __getitem__(self, order_id):
+        return self._orders[order_id]
+
+    def __iter__(self):
+        return iter(list(self._orders))
+
+    def __len__(self):
+        return len(self._orders)
+
+    def values(self):
+        return list(self._orders.values())
+
+    def items(self):
+        return list(self._orders.items())
+
+    def by_symbol(self, symbol, mode=None):
+        """positions of symbol, of one side when mode is 'buy' or 'sell'"""
+        modes = [mode] if mode is not None else list(SIDES.values())
+        return [trans for m in modes
+                for trans in list(self._index.get((symbol, m), {}).values())]
+
+    def profit(self, symbol=None):
+        """profit of all positions or of one symbol's"""
+        positions = self.by_symbol(symbol) if symbol is not None else self.values()
+        return sum(trans.actual_profit for trans in positions)
+
+    def _put(self, trans_dict):
+        """update the position in place, return it when it is new"""
+        trans = self._orders.get(trans_dict['order'])
+        if trans is not None:
+            trans.update(trans_dict)
+            return None
+        trans = Transaction(trans_dict)
+        self._orders[trans.order_id] = trans
+        self._index.setdefault((trans.symbol, trans.mode), {})[trans.order_id] = trans
+        return trans
+
+    def to_array(self, symbol=None):
+        """positions (all or one symbol's) as a numpy structured array of
+        DTYPE, side is +1 buy and -1 sell"""
+        import numpy as np
+        positions = self.by_symbol(symbol) if symbol is not None else self.values()
+        return np.array([(t.order_id, t.symbol, 1 if t.mode == 'buy' else -1, t.volume,
+                          t.open_price, t.price, t.actual_profit, t.timestamp)
+                         for t in positions], dtype=DTYPE)
+
+    def to_frame(self, symbol=None):
+        """to_array() as a pandas.DataFrame"""
+        import pandas as pd
+        return pd.DataFrame(self.to_array(symbol))
+
+    def _remove(self, order_id):
+        trans = self._orders.pop(order_id, None)
+        if trans is not None:
+            del self._index[(trans.symbol, trans.mode)][order_id]
+        return trans
+
+    def sync(self, trades):
+        """apply the difference to a getTrades(opened_only=True) response
+        return: (opened, closed) lists of Transaction"""
+        trades = {t['order']: t for t in trades if t['cmd'] in SIDES}
+        with self._lock:
+            closed = [self._remove(order_id) for order_id in list(self._orders)
+                      if order_id not in trades]
+            opened = [self._put(trans_dict) for trans_dict in trades.values()]
+        return [trans for trans in opened if trans is not None], closed
+
+    def apply(self, data):
+        """apply one streamed 'trade' record, e.g.
+        stream.on('trade', book.apply)"""
+        if data['cmd'] not in SIDES:
+            return
+        with self._lock:
+            if data.get('closed') or data.get('type') in (CLOSE, DELETE):
+                # a close record may carry the closing order, position is the opening one
+                self._remove(data['order'])
+                self._remove(data.get('position'))
+            else:
+                self._put(data)
+
+    def apply_profit(self, data):
+        """apply one streamed 'profit' record, e.g.
+        stream.on('profit', book.apply_profit)"""
+        trans = self._orders.get(data['order'])
+        if trans is not None:
+            trans.actual_profit = data['profit']
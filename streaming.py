@@ -0,0 +1,154 @@
+"""
+XTBApi.streaming
+~~~~~~~
+
+Streaming module, subscriptions on the session of a logged in client
+"""
+
+import json
+import queue
+import threading
+from websockets.sync.client import connect
+from websockets.exceptions import WebSocketException
+
+from api import NotLogged, SocketError
+
+
+class StreamClient(object):
+    """streaming client of a logged in api.BaseClient
+
+    messages arrive as (command, data), e.g. ('candle', {...}), to the
+    callbacks registered with on() and to the bounded queue read by
+    messages(). A full queue blocks the reader, which then stops reading
+    the socket until the consumer catches up."""
+
+    def __init__(self, client, maxsize=1000, buffered=True,
+                 url='wss://ws.xtb.com'):
+        if client.stream_session_id is None:
+            raise NotLogged()
+        self.session_id = client.stream_session_id
+        self.url = f"{url}/{client.mode}Stream"
+        self.limiter = client.limiter
+        self.ws = None
+        self.buffered = buffered
+        self.queue = queue.Queue(maxsize)
+        self._callbacks = {}
+        self._close_callbacks = []
+        self.stopped = False
+
+    def connect(self):
+        self.ws = connect(self.url)
+        threading.Thread(target=self._read_loop, args=(self.ws,),
+                         daemon=True).start()
+        return self
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read_loop(self, ws):
+        try:
+            for message in ws:
+                res = json.loads(message)
+                command, data = res.get('command'), res.get('data')
+                for callback in self._callbacks.get(command, []):
+                    callback(data)
+                if self.buffered:
+                    self.queue.put((command, data))
+        except WebSocketException:
+            pass
+        finally:
+            # a failing callback also ends the stream, so it is never half alive
+            ws.close()
+            self.stopped = True
+            for callback in self._close_callbacks:
+                callback()
+            if self.buffered:
+                self.queue.put(None)
+
+    def on(self, command, callback):
+        """call callback(data) for every message of command"""
+        self._callbacks.setdefault(command, []).append(callback)
+
+    def on_close(self, callback):
+        """call callback() once the reader stops, closed or failed"""
+        self._close_callbacks.append(callback)
+        if self.stopped:
+            callback()
+
+    def messages(self, timeout=None):
+        """yield (command, data) until the stream is closed"""
+        while True:
+            item = self.queue.get(timeout=timeout)
+            if item is None:
+                return
+            yield item
+
+    def _send(self, command, **arguments):
+        self.limiter.wait()
+        data = {'command': command, 'streamSessionId': self.session_id}
+        data.update(arguments)
+        try:
+            self.ws.send(json.dumps(data))
+        except WebSocketException:
+            raise SocketError()
+
+    def get_balance(self):
+        """getBalance subscription, 'balance' messages"""
+        self._send("getBalance")
+
+    def stop_balance(self):
+        self._send("stopBalance")
+
+    def get_candles(self, symbol):
+        """getCandles subscription, 'candle' messages"""
+        self._send("getCandles", symbol=symbol)
+
+    def stop_candles(self, symbol):
+        self._send("stopCandles", symbol=symbol)
+
+    def get_keep_alive(self):
+        """getKeepAlive subscription, 'keepAlive' messages"""
+        self._send("getKeepAlive")
+
+    def stop_keep_alive(self):
+        self._send("stopKeepAlive")
+
+    def get_profits(self):
+        """getProfits subscription, 'profit' messages"""
+        self._send("getProfits")
+
+    def stop_profits(self):
+        self._send("stopProfits")
+
+    def get_tick_prices(self, symbol, min_arrival_time=0, max_level=0):
+        """getTickPrices subscription, 'tickPrices' messages"""
+        self._send("getTickPrices", symbol=symbol,
+                   minArrivalTime=min_arrival_time, maxLevel=max_level)
+
+    def stop_tick_prices(self, symbol):
+        self._send("stopTickPrices", symbol=symbol)
+
+    def get_trades(self):
+        """getTrades subscription, 'trade' messages"""
+        self._send("getTrades")
+
+    def stop_trades(self):
+        self._send("stopTrades")
+
+    def get_trade_status(self):
+        """getTradeStatus subscription, 'tradeStatus' messages"""
+        self._send("getTradeStatus")
+
+    def stop_trade_status(self):
+        self._send("stopTradeStatus")
+
+    def ping(self):
+        """ping command, keeps the stream session alive"""
+        self._send("ping")
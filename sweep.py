@@ -0,0 +1,178 @@
+"""
+Parameter sweep, backtests every (or a random sample of) combination of a
+strategy's tech lengths and rate_tp/rate_sl on archived candles and ranks
+them by the summed per trade return over the symbols, which unlike price
+PnL does not let the symbol with the largest price decide
+
+    python sweep.py GOLD EURUSD --period 15 --strategy macd --samples 500
+
+the candle columns and the EMA of every length in the space are computed
+once and placed in shared memory, workers attach to them at start-up and
+a task only carries its parameters
+"""
+
+import argparse
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+
+from archive import CandleArchive
+from backtest import macd_signals, pullback_signals, simulate, summary
+from indicators import ema
+
+SPACES = {
+    'macd': {
+        'fast': [5, 8, 12],
+        'slow': [17, 21, 26, 34],
+        'signal': [5, 9],
+        'rate_tp': [0.005, 0.01, 0.02, 0.05, 0.2],
+        'rate_sl': [0.0025, 0.005, 0.01, 0.1],
+    },
+    'pullback': {
+        'lengths': [(25, 50, 100, 200), (20, 50, 100, 200), (10, 20, 50, 100), (8, 21, 55, 144)],
+        'rate_tp': [0, 0.005, 0.01, 0.02],
+        'rate_sl': [0, 0.0025, 0.005, 0.01],
+    },
+}
+PRICES = ('high', 'low', 'close')
+
+# worker side {symbol: {column: array view}}, set by _attach
+_columns = {}
+_blocks = []
+
+
+def valid(name, params):
+    if name == 'macd':
+        return params['fast'] < params['slow']
+    return list(params['lengths']) == sorted(set(params['lengths']))
+
+
+def grid(name, space=None):
+    """every valid combination of the space"""
+    space = space or SPACES[name]
+    keys = list(space)
+    combos = (dict(zip(keys, values)) for values in itertools.product(*space.values()))
+    return [params for params in combos if valid(name, params)]
+
+
+def sample(name, n, space=None, seed=None):
+    """n distinct valid combinations drawn at random"""
+    combos = grid(name, space)
+    return random.Random(seed).sample(combos, min(n, len(combos)))
+
+
+def ema_lengths(name, candidates):
+    if name == 'macd':
+        return sorted({p[k] for p in candidates for k in ('fast', 'slow')})
+    return sorted({n for p in candidates for n in p['lengths']})
+
+
+def share(archive, symbols, period, lengths, start=None, end=None):
+    """one shared block per symbol holding the price columns and EMA_<length>
+    rows, return: (blocks, layout) where layout is what workers attach to"""
+    blocks, layout = [], {}
+    for symbol in symbols:
+        candles = archive.read(symbol, period, start, end)
+        close = candles[:, 4]
+        names = list(PRICES) + [f'EMA_{n}' for n in lengths]
+        shape = (len(names), len(candles))
+        block = shared_memory.SharedMemory(create=True, size=max(8 * shape[0] * shape[1], 1))
+        table = np.ndarray(shape, dtype='<f8', buffer=block.buf)
+        table[:3] = candles[:, [2, 3, 4]].T
+        for row, n in enumerate(lengths, 3):
+            table[row] = ema(close, n)
+        blocks.append(block)
+        layout[symbol] = (block.name, shape, names)
+    return blocks, layout
+
+
+def _attach(layout):
+    """pool initializer, map the shared blocks read only"""
+    for symbol, (block_name, shape, names) in layout.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _blocks.append(block)
+        table = np.ndarray(shape, dtype='<f8', buffer=block.buf)
+        table.flags.writeable = False
+        _columns[symbol] = dict(zip(names, table))
+
+
+def frame(symbol, name, params):
+    """backtest frame of one symbol from the shared columns, with the
+    columns of indicators.strategy that the strategy's signal reads"""
+    import pandas as pd
+    cols = _columns[symbol]
+    df = pd.DataFrame({c: cols[c] for c in PRICES}, copy=False)
+    if name == 'macd':
+        key = f"{params['fast']}_{params['slow']}_{params['signal']}"
+        line = cols[f"EMA_{params['fast']}"] - cols[f"EMA_{params['slow']}"]
+        signal = np.full(len(line), np.nan)
+        valid_from = np.flatnonzero(~np.isnan(line))
+        if valid_from.size:
+            signal[valid_from[0]:] = ema(line[valid_from[0]:], params['signal'])
+        # MACD_..._A_0, the column macd_cross reads
+        with np.errstate(invalid='ignore'):
+            df[f'MACD_{key}_A_0'] = (line >= 0).astype(int)
+        # rows the full strategy frame would drop as NaN
+        df = df[~np.isnan(signal)]
+    else:
+        for n in params['lengths']:
+            df[f'EMA_{n}'] = cols[f'EMA_{n}']
+        df = df.dropna()
+    return df.reset_index(drop=True)
+
+
+def evaluate(symbols, name, params):
+    """worker task, params summed over the symbols"""
+    signal_fn = macd_signals if name == 'macd' else pullback_signals
+    result = {'params': params, 'trades': 0, 'wins': 0, 'pnl': 0., 'return': 0.}
+    for symbol in symbols:
+        candles = frame(symbol, name, params)
+        trades = simulate(candles, signal_fn(candles), params['rate_tp'],
+                          params['rate_sl'], params.get('volume', 0.1))
+        for k, v in summary(trades).items():
+            result[k] += v
+    return result
+
+
+def sweep(symbols, period, name='macd', root='archive', candidates=None,
+          processes=None, start=None, end=None):
+    """backtest the candidates (default the whole grid) on all cores,
+    return: results sorted by return, best first"""
+    candidates = candidates or grid(name)
+    blocks, layout = share(CandleArchive(root), symbols, period,
+                           ema_lengths(name, candidates), start, end)
+    try:
+        with ProcessPoolExecutor(max_workers=processes or os.cpu_count(),
+                                 initializer=_attach, initargs=(layout,)) as pool:
+            chunksize = max(1, len(candidates) // (4 * (processes or os.cpu_count())))
+            results = list(pool.map(evaluate, itertools.repeat(symbols),
+                                    itertools.repeat(name), candidates,
+                                    chunksize=chunksize))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return sorted(results, key=lambda r: r['return'], reverse=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--period', type=int, default=15)
+    parser.add_argument('--strategy', default='macd', choices=list(SPACES))
+    parser.add_argument('--archive', default=os.getenv('ARCHIVE_DIR', 'archive'))
+    parser.add_argument('--samples', type=int, help='random search size, whole grid if unset')
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+    candidates = (sample(args.strategy, args.samples, seed=args.seed) if args.samples
+                  else grid(args.strategy))
+    results = sweep(args.symbols, args.period, args.strategy, args.archive, candidates,
+                    args.processes)
+    for rank, result in enumerate(results[:args.top], 1):
+        print(f"{rank:3d}. return {result['return']:8.2%}  trades {result['trades']:6d}  "
+              f"wins {result['wins']:6d}  {result['params']}")
@@ -3,7 +3,6 @@ import time
 from datetime import datetime
 from websockets.sync.client import connect
 import pandas as pd
-import pandas_ta as ta
 
 # Settings.json
 settings = {
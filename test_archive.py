@@ -0,0 +1,32 @@
+"""
+CandleArchive round trip and zero-copy reads, run: python -m pytest test_archive.py
+"""
+
+from archive import CandleArchive
+
+
+def _chart(ctms, digits=2):
+    return {'digits': digits,
+            'rateInfos': [{'ctm': ctm * 1000, 'open': 1000 + i, 'close': 5, 'high': 9,
+                           'low': -3, 'vol': 1.} for i, ctm in enumerate(ctms)]}
+
+
+def test_append_overwrites_last_candle(tmp_path):
+    archive = CandleArchive(str(tmp_path))
+    assert archive.append('GOLD', 15, _chart([0, 900, 1800])) == 3
+    # the forming last candle comes again with the new ones
+    assert archive.append('GOLD', 15, _chart([900, 1800, 2700])) == 2
+    assert archive.read('GOLD', 15)[:, 0].tolist() == [0, 900, 1800, 2700]
+    assert archive.read('GOLD', 15, 900, 1800)[:, 0].tolist() == [900, 1800]
+
+
+def test_read_frame_shares_the_mapped_records(tmp_path):
+    archive = CandleArchive(str(tmp_path))
+    archive.append('GOLD', 15, _chart(range(0, 9000, 900)))
+    frame = archive.read_frame('GOLD', 15)
+    # rewrite the last record in the file, a copy would not see it
+    last = _chart([8100])
+    last['rateInfos'][0]['open'] = 5000
+    archive.append('GOLD', 15, last)
+    assert frame['open'].iloc[-1] == 50.
+    assert frame['close'].tolist() == archive.read('GOLD', 15)[:, 4].tolist()
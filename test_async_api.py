@@ -0,0 +1,89 @@
+"""
+AsyncClient against a local fake XTB server, run: python -m pytest test_async_api.py
+"""
+
+import asyncio
+import json
+
+import pytest
+from websockets.server import serve
+
+from api import SocketError
+from async_api import AsyncClient
+from throttle import TokenBucket
+
+HOURS = [{'symbol': 'GOLD', 'trading': [{'day': 1, 'fromT': 3_600_000, 'toT': 82_800_000}],
+          'quotes': [{'day': 1, 'fromT': 0, 'toT': 86_400_000}]}]
+
+
+async def _reply(ws, req):
+    """answer one request, later requests first, like a busy server"""
+    command, arguments = req['command'], req.get('arguments', {})
+    res = {'status': True, 'customTag': req['customTag']}
+    if command == 'login':
+        res['streamSessionId'] = 'stream-1'
+    elif command == 'getSymbol':
+        await asyncio.sleep(0.1 / int(req['customTag']))
+        res['returnData'] = {'symbol': arguments['symbol']}
+    elif command == 'getChartRangeRequest':
+        res['returnData'] = {'digits': 2, 'rateInfos': [], 'symbol': arguments['info']['symbol']}
+    elif command == 'getTradingHours':
+        res['returnData'] = HOURS
+    elif command == 'getVersion':
+        # dropped connection with a request in flight
+        await ws.close()
+        return
+    await ws.send(json.dumps(res))
+
+
+async def _handler(ws):
+    tasks = set()
+    async for message in ws:
+        task = asyncio.create_task(_reply(ws, json.loads(message)))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+
+def _run(test):
+    async def main():
+        async with serve(_handler, 'localhost', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            client = AsyncClient(TokenBucket(rate=1000, burst=100), url=f'ws://localhost:{port}')
+            await client.login('user', 'pass')
+            await test(client)
+    asyncio.run(main())
+
+
+def test_concurrent_commands_get_their_own_responses():
+    async def test(client):
+        symbols = [f'SYM{i}' for i in range(8)]
+        results = await asyncio.gather(*[client.get_symbol(s) for s in symbols])
+        assert [r['symbol'] for r in results] == symbols
+        charts = await client.get_chart_range_requests([(s, 15, 0, 0, -100) for s in symbols])
+        assert [c['symbol'] for c in charts] == symbols
+    _run(test)
+
+
+def test_trading_hours_in_seconds():
+    async def test(client):
+        hours = await client.get_trading_hours(['GOLD'])
+        assert hours[0]['trading'][0]['fromT'] == 3600
+        assert hours[0]['quotes'][0]['toT'] == 86400
+    _run(test)
+
+
+def test_logout_stops_the_reader():
+    async def test(client):
+        reader = client._reader
+        assert not reader.done()
+        await client.logout()
+        await asyncio.sleep(0)
+        assert reader.done()
+    _run(test)
+
+
+def test_dropped_connection_fails_pending_requests():
+    async def test(client):
+        with pytest.raises(SocketError):
+            await client.get_version()
+    _run(test)
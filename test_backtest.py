@@ -0,0 +1,44 @@
+"""
+Backtest signals against the strategies' own functions, run: python -m pytest test_backtest.py
+"""
+
+import numpy as np
+import pandas as pd
+
+from backtest import pullback_signals, simulate, summary
+from ema_align_pullback import pullback, pullback_series
+
+
+def _degree(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    # runs of aligned MAs between zeros, as ma_align_frame gives them
+    return np.where(rng.random(n) < 0.05, 0, rng.integers(-4, 5, n))
+
+
+def test_pullback_series_matches_pullback():
+    for seed in range(5):
+        degree = _degree(seed=seed)
+        action = np.where(degree > 0, 'buy', np.where(degree < 0, 'sell', 'stay'))
+        expected = [pullback(action[:i + 1], degree[:i + 1])[0] for i in range(len(degree))]
+        assert pullback_series(action, degree).tolist() == expected
+
+
+def test_pullback_signals_modes_agree():
+    rng = np.random.default_rng(1)
+    close = 100 + np.cumsum(rng.normal(size=2000))
+    candles = pd.DataFrame({'close': close, 'high': close + 1, 'low': close - 1})
+    for n in (5, 10, 20, 40):
+        candles[f'EMA_{n}'] = pd.Series(close).ewm(span=n, adjust=False).mean()
+    assert pullback_signals(candles.copy(), bar_by_bar=True) == \
+        pullback_signals(candles.copy(), bar_by_bar=False)
+
+
+def test_simulate_returns_are_relative():
+    candles = pd.DataFrame({'close': [100., 100., 100.], 'high': [100., 103., 100.],
+                            'low': [100., 99., 100.]})
+    buy = simulate(candles, [(0, 'buy')], rate_tp=0.02, rate_sl=0.02)
+    assert buy[0][3] == 102.
+    assert summary(buy)['return'] == 0.02
+    # the same move on a 100x price is the same return
+    scaled = simulate(candles * 100, [(0, 'buy')], rate_tp=0.02, rate_sl=0.02)
+    assert summary(scaled)['return'] == summary(buy)['return']
@@ -0,0 +1,35 @@
+"""
+ma_align_frame against the row function, run: python -m pytest test_ema_align_pullback.py
+"""
+
+import numpy as np
+import pandas as pd
+
+from ema_align_pullback import ma_align, ma_align_frame
+
+COLUMNS = ['close', 'EMA_25', 'EMA_50', 'EMA_100', 'EMA_200']
+
+
+def _expected(df):
+    return pd.DataFrame(list(df.apply(ma_align, axis=1)), index=df.index)
+
+
+def test_ma_align_frame_matches_ma_align():
+    rng = np.random.default_rng(0)
+    # few distinct values, so close and the MAs tie often
+    tied = rng.integers(0, 4, (4000, len(COLUMNS))).astype(float)
+    rows = np.vstack([rng.normal(size=(4000, len(COLUMNS))), tied])
+    # MAs sorted and reverse sorted, close anywhere among them
+    mas = np.sort(rng.normal(size=(2000, len(COLUMNS) - 1)), axis=1)
+    close = rng.normal(size=(2000, 1))
+    rows = np.vstack([rows, np.hstack([close, mas]), np.hstack([close, mas[:, ::-1]])])
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    pd.testing.assert_frame_equal(ma_align_frame(df), _expected(df), check_dtype=False)
+
+
+def test_ma_align_frame_orders_by_length():
+    # columns out of length order, as after merges
+    df = pd.DataFrame({'EMA_200': [1., 4.], 'close': [5., 0.], 'EMA_25': [4., 1.],
+                       'EMA_100': [2., 3.], 'EMA_50': [3., 2.]})
+    assert ma_align_frame(df).to_dict('list') == {'Action': ['buy', 'sell'], 'Degree': [0, 0]}
+    pd.testing.assert_frame_equal(ma_align_frame(df), _expected(df), check_dtype=False)
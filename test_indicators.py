@@ -0,0 +1,70 @@
+"""
+Column contract of indicators.py with pandas-ta, run: python -m pytest test_indicators.py
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from indicators import IndicatorState, strategy
+
+TECH = [
+    {"kind": "ema", "length": 8},
+    {"kind": "ema", "length": 21},
+    {"kind": "macd", "fast": 8, "slow": 21, "signal_indicators": True},
+]
+# df.ta.strategy(ta.Strategy(ta=TECH)) of pandas-ta 0.3.14b
+COLUMNS = ['EMA_8', 'EMA_21', 'MACD_8_21_9', 'MACDh_8_21_9', 'MACDs_8_21_9',
+           'MACDh_8_21_9_XA_0', 'MACDh_8_21_9_XB_0', 'MACD_8_21_9_A_0']
+# df.ta.strategy output for TECH from pandas-ta-classic 0.3.14b1, the maintained
+# fork of pandas-ta 0.3.14b (gone from PyPI), on the close series
+# np.round(100 + np.cumsum(np.random.default_rng(0).normal(size=80)), 2)
+PANDAS_TA = os.path.join(os.path.dirname(__file__), 'test_indicators.csv')
+
+
+def _close(n=300, seed=0):
+    return 100 + np.cumsum(np.random.default_rng(seed).normal(size=n))
+
+
+def test_strategy_columns():
+    df = strategy(pd.DataFrame({'close': _close()}), TECH)
+    assert df.columns.to_list() == ['close'] + COLUMNS
+
+
+def test_matches_pandas_ta():
+    expected = pd.read_csv(PANDAS_TA)
+    df = strategy(expected[['close']].copy(), TECH)
+    pd.testing.assert_frame_equal(df, expected, check_dtype=False, rtol=0, atol=1e-10)
+    state = IndicatorState(TECH)
+    inc = pd.DataFrame([state.update(i, c) for i, c in enumerate(expected['close'])])
+    pd.testing.assert_frame_equal(inc.drop(columns='ctm'), expected[COLUMNS],
+                                  check_dtype=False, rtol=0, atol=1e-10)
+
+
+def test_signal_flags():
+    df = strategy(pd.DataFrame({'close': _close()}), TECH)
+    hist, line = df['MACDh_8_21_9'], df['MACD_8_21_9']
+    # pandas-ta cross_value / above_value
+    above, below_before = hist > 0, hist.shift(1) < 0
+    assert (df['MACDh_8_21_9_XA_0'] == (above & below_before).astype(int)).all()
+    assert (df['MACDh_8_21_9_XB_0'] == (~above & ~below_before).astype(int)).all()
+    assert (df['MACD_8_21_9_A_0'] == (line >= 0).astype(int)).all()
+
+
+def test_incremental_rows_match_strategy():
+    close = _close()
+    df = strategy(pd.DataFrame({'close': close}), TECH)
+    state = IndicatorState(TECH)
+    rows = [state.update(i, c) for i, c in enumerate(close)]
+    assert list(rows[-1]) == ['ctm'] + COLUMNS
+    inc = pd.DataFrame(rows).drop(columns='ctm')
+    pd.testing.assert_frame_equal(inc, df[COLUMNS], check_dtype=False)
+
+
+def test_macd_cross_uses_macd_line():
+    from macd_crossover import macd_cross
+    df = pd.DataFrame({'MACD_8_21_9': [-0.1, 0.1], 'MACDh_8_21_9': [0.2, 0.3],
+                       'MACDs_8_21_9': [-0.3, -0.2], 'MACDh_8_21_9_XA_0': [0, 0],
+                       'MACDh_8_21_9_XB_0': [0, 0], 'MACD_8_21_9_A_0': [0, 1]})
+    assert macd_cross(df) == (True, 'buy')
@@ -0,0 +1,72 @@
+"""
+XTBApi.throttle
+~~~~~~~
+
+Request rate limiting shared by the clients of one account
+"""
+
+import threading
+import time
+
+MAX_TIME_INTERVAL = 0.200
+
+
+class TokenBucket(object):
+    """token bucket of `burst` requests refilled at `rate` per second
+
+    thread-safe through wait() and asyncio-safe through wait_async(), a
+    request reserves its slot under the lock and sleeps outside of it"""
+
+    _accounts = {}
+    _accounts_lock = threading.Lock()
+
+    def __init__(self, rate=1 / MAX_TIME_INTERVAL, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._time_last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.throttled_s = 0.0
+
+    @classmethod
+    def for_account(cls, user_id, **kwargs):
+        """the bucket shared by every client logged in as user_id"""
+        with cls._accounts_lock:
+            if user_id not in cls._accounts:
+                cls._accounts[user_id] = cls(**kwargs)
+            return cls._accounts[user_id]
+
+    def _reserve(self):
+        """take a token, return the seconds to wait until it is refilled"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens +
+                               (now - self._time_last_refill) * self.rate)
+            self._time_last_refill = now
+            self._tokens -= 1
+            self.requests += 1
+            if self._tokens >= 0:
+                return 0.
+            delay = -self._tokens / self.rate
+            self.throttled += 1
+            self.throttled_s += delay
+            return delay
+
+    def wait(self):
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        delay = self._reserve()
+        if delay:
+            import asyncio
+            await asyncio.sleep(delay)
+
+    def metrics(self):
+        """requests seen, how many were delayed and the total delay"""
+        with self._lock:
+            return {'requests': self.requests, 'throttled': self.throttled,
+                    'throttled_s': self.throttled_s}
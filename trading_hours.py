@@ -0,0 +1,115 @@
+"""
+XTBApi.trading_hours
+~~~~~~~
+
+Local market open/close lookups from cached getTradingHours responses
+"""
+
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+# getTradingHours fromT/toT are counted from 00:00 CET/CEST
+MARKET_TZ = ZoneInfo('Europe/Warsaw')
+DAY = 86_400
+WEEK = 7 * DAY
+TTL = DAY
+
+
+def _week_start(now):
+    """monday 00:00 market time of the week of now, timezone aware"""
+    _td = datetime.fromtimestamp(now, MARKET_TZ)
+    return (_td - timedelta(days=_td.isoweekday() - 1)).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+
+
+def _week_seconds(now):
+    """wall clock seconds since monday 00:00 market time"""
+    _td = datetime.fromtimestamp(now, MARKET_TZ)
+    return ((_td.isoweekday() - 1) * DAY + _td.hour * 3600 +
+            _td.minute * 60 + _td.second)
+
+
+class TradingHours(object):
+    """per symbol index of weekly trading sessions, refreshed after ttl
+
+    sessions are sorted (start, end) seconds of the market week, days
+    that run into each other are merged so a session open over midnight
+    is one interval"""
+
+    def __init__(self, ttl=TTL):
+        self.ttl = ttl
+        self._sessions = {}
+        self._fetched_at = {}
+
+    def __contains__(self, symbol):
+        return symbol in self._sessions
+
+    def update(self, response):
+        """index a get_trading_hours response (fromT/toT in seconds)"""
+        now = time.time()
+        for symbol in response:
+            days = sorted(((day['day'] - 1) * DAY + day['fromT'],
+                           (day['day'] - 1) * DAY + day['toT'])
+                          for day in symbol['trading'])
+            sessions = []
+            for start, end in days:
+                if sessions and start <= sessions[-1][1]:
+                    sessions[-1][1] = max(sessions[-1][1], end)
+                else:
+                    sessions.append([start, end])
+            self._sessions[symbol['symbol']] = (
+                [s for s, _ in sessions], [e for _, e in sessions])
+            self._fetched_at[symbol['symbol']] = now
+
+    def expired(self, list_of_symbols):
+        """symbols not cached or older than ttl"""
+        now = time.time()
+        return [symbol for symbol in list_of_symbols
+                if now - self._fetched_at.get(symbol, 0) > self.ttl]
+
+    def refresh(self, client, list_of_symbols):
+        """fetch trading hours only for expired symbols"""
+        expired = self.expired(list_of_symbols)
+        if expired:
+            self.update(client.get_trading_hours(expired))
+
+    def _session(self, symbol, sow):
+        """index of the session holding sow, None when closed"""
+        starts, ends = self._sessions[symbol]
+        i = bisect_right(starts, sow) - 1
+        if i >= 0 and sow <= ends[i]:
+            return i
+        return None
+
+    def is_open(self, symbol, now=None):
+        now = time.time() if now is None else now
+        return self._session(symbol, _week_seconds(now)) is not None
+
+    def next_open(self, symbol, now=None):
+        """epoch of the next session start after now, None if no sessions"""
+        now = time.time() if now is None else now
+        starts, _ = self._sessions[symbol]
+        if not starts:
+            return None
+        sow = _week_seconds(now)
+        i = bisect_right(starts, sow)
+        week = _week_start(now)
+        if i == len(starts):
+            return (week + timedelta(seconds=WEEK + starts[0])).timestamp()
+        return (week + timedelta(seconds=starts[i])).timestamp()
+
+    def next_close(self, symbol, now=None):
+        """epoch the current session closes, None when closed"""
+        now = time.time() if now is None else now
+        sow = _week_seconds(now)
+        i = self._session(symbol, sow)
+        if i is None:
+            return None
+        starts, ends = self._sessions[symbol]
+        end = ends[i]
+        # continues into the first session of next week
+        if end >= WEEK and starts[0] == 0:
+            end = WEEK + ends[0]
+        return (_week_start(now) + timedelta(seconds=end)).timestamp()